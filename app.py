@@ -1,118 +1,144 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, abort
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, abort, session, make_response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.utils import secure_filename
 from email_validator import validate_email, EmailNotValidError
 from config import Config
-from models import db, User, Game, Comment, CommentTagHistory, Report
+from cache import create_cache, LRUCache, TimedLRUCache
+from ratelimit import create_rate_limiter
+from metrics import RequestMetrics
+from markupsafe import Markup
+from database import engine_options, configure_engine
+from models import db, User, Game, GameFile, Comment, CommentTagHistory, Report, StoredFile, init_password_hashing
+from migrations import pending_migrations, run_migrations, current_version, backfill_report_aggregates
+from search import (index_game, index_comment, unindex_game, rebuild_search_index, search_rows,
+                    encode_search_cursor, decode_search_cursor, highlight_excerpt, search_available)
+from export import export_rows, iter_csv, iter_ndjson
+from archive import read_manifest, preview_type, ArchiveCache
+from storage import (content_path, receive_upload, place_upload, remove_stored_file, attachment_header,
+                     XAccelRedirectMiddleware)
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import func, and_, or_, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
 from urllib.parse import urlparse, urljoin
 from datetime import datetime, timedelta
+import click
+import hashlib
 import os
+import random
+import threading
+import time
+import uuid
+import zipfile
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Initialize extensions
+# Initialize extensions (engine options and SQLite pragmas come from the engine profile in database.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(app.config), **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
 db.init_app(app)
+init_password_hashing(app.config['PASSWORD_HASH_WORKERS'])
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
-# Create upload folder if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Small key/value cache for hot aggregates (shared across workers when SHARED_CACHE_PATH is set)
+cache = create_cache(app.config['SHARED_CACHE_PATH'])
+# Rendered comment-thread fragments, keyed by per-target versions kept in the cache above
+fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_MAX_BYTES'])
+# User rows for Flask-Login, validated against per-user versions kept in the cache above
+user_cache = TimedLRUCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+# Memory-mapped game ZIPs kept open for serving individual members
+archive_cache = ArchiveCache(app.config['ARCHIVE_HANDLE_CACHE_SIZE'])
+# Sliding-window throttles for comment posting and reporting (shared across workers when SHARED_CACHE_PATH is set)
+rate_limiter = create_rate_limiter(app.config['SHARED_CACHE_PATH'])
+# Per-endpoint query counts, SQL/render time and latency, served at /admin/metrics
+request_metrics = RequestMetrics(app.config['SLOW_REQUEST_THRESHOLD_MS'] / 1000,
+                                 app.config['SLOW_REQUEST_MAX_STATEMENTS'])
 
-# Create database tables
-with app.app_context():
-    db.create_all()
 
-    # Migration: Update existing comments to have target_type and target_id
-    # This ensures backwards compatibility with existing data
-    comments_to_migrate = Comment.query.filter(Comment.target_type == None).all()
-    if comments_to_migrate:
-        for comment in comments_to_migrate:
-            comment.target_type = 'game'
-            comment.target_id = comment.game_id
-        db.session.commit()
-
-    # Migration: Initialize soft delete fields for existing comments
-    # Set is_deleted=False for any existing comments that don't have this field set
-    try:
-        comments_to_update = Comment.query.filter(Comment.is_deleted == None).all()
-        if comments_to_update:
-            for comment in comments_to_update:
-                comment.is_deleted = False
-            db.session.commit()
-    except Exception:
-        # Column might not exist yet on first run after schema update
-        db.session.rollback()
+def user_version_key(user_id):
+    """Cache key of the version token for a user's cached row."""
+    return f'user_version:{user_id}'
 
-    # Migration: Initialize is_admin for existing users
-    try:
-        users_to_update = User.query.filter(User.is_admin == None).all()
-        if users_to_update:
-            for user in users_to_update:
-                user.is_admin = False
-            db.session.commit()
-    except Exception:
-        # Column might not exist yet on first run after schema update
-        db.session.rollback()
 
-    # Migration: Initialize report resolution fields for existing comments
-    try:
-        comments_to_update = Comment.query.filter(Comment.is_report_resolved == None).all()
-        if comments_to_update:
-            for comment in comments_to_update:
-                comment.is_report_resolved = False
-            db.session.commit()
-            print(f'[Migration] Initialized is_report_resolved for {len(comments_to_update)} comments')
-    except Exception as e:
-        # Column might not exist yet on first run after schema update
-        db.session.rollback()
-        print(f'[Migration] Note: Report resolution columns will be added on first run: {e}')
-
-    # Bootstrap admin account
-    def ensure_bootstrap_admin():
-        """
-        Ensure a bootstrap admin account exists for local development.
-        Can be disabled by setting DISABLE_BOOTSTRAP_ADMIN=1 environment variable.
-        """
-        # Check if bootstrap is disabled
-        if os.environ.get('DISABLE_BOOTSTRAP_ADMIN') == '1':
-            print('[Bootstrap] Admin bootstrap disabled (DISABLE_BOOTSTRAP_ADMIN=1)')
-            return
+def invalidate_cached_user(user_id):
+    """Drop a user's cached row in every worker; call after committing a change to the user."""
+    user_cache.delete(user_id)
+    cache.set(user_version_key(user_id), uuid.uuid4().hex)
 
-        # Check if admin user exists
-        admin_user = User.query.filter_by(username='admin').first()
 
-        if admin_user:
-            # User exists - ensure is_admin is True (promote if needed)
-            if not admin_user.is_admin:
-                admin_user.is_admin = True
-                db.session.commit()
-                print('[Bootstrap] ⚠️  Admin user promoted to admin role (username: admin)')
-            else:
-                print('[Bootstrap] Admin user already exists (username: admin)')
+def ensure_bootstrap_admin():
+    """
+    Ensure a bootstrap admin account exists for local development.
+    Can be disabled by setting DISABLE_BOOTSTRAP_ADMIN=1 environment variable.
+    """
+    # Check if bootstrap is disabled
+    if os.environ.get('DISABLE_BOOTSTRAP_ADMIN') == '1':
+        print('[Bootstrap] Admin bootstrap disabled (DISABLE_BOOTSTRAP_ADMIN=1)')
+        return
+
+    # Check if admin user exists
+    admin_user = User.query.filter_by(username='admin').first()
+
+    if admin_user:
+        # User exists - ensure is_admin is True (promote if needed)
+        if not admin_user.is_admin:
+            admin_user.is_admin = True
+            db.session.commit()
+            invalidate_cached_user(admin_user.id)
+            print('[Bootstrap] ⚠️  Admin user promoted to admin role (username: admin)')
         else:
-            # Create new bootstrap admin
-            admin_user = User(
-                username='admin',
-                email='admin@local',
-                is_admin=True
-            )
-            admin_user.set_password('admin')
-            db.session.add(admin_user)
+            print('[Bootstrap] Admin user already exists (username: admin)')
+    else:
+        # Create new bootstrap admin
+        admin_user = User(
+            username='admin',
+            email='admin@local',
+            is_admin=True
+        )
+        admin_user.set_password('admin')
+        db.session.add(admin_user)
+        try:
             db.session.commit()
-            print('[Bootstrap] ✓ Bootstrap admin created (username: admin, password: admin, email: admin@local)')
-            print('[Bootstrap] ⚠️  WARNING: Change the admin password immediately!')
-
-    # Run bootstrap admin function
-    ensure_bootstrap_admin()
+        except IntegrityError:
+            # Several workers starting on a fresh database race to create it
+            db.session.rollback()
+            print('[Bootstrap] Admin user created by another worker (username: admin)')
+            return
+        print('[Bootstrap] ✓ Bootstrap admin created (username: admin, password: admin, email: admin@local)')
+        print('[Bootstrap] ⚠️  WARNING: Change the admin password immediately!')
 
 
 # Flask-Login user loader
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """
+    Load the logged-in user, from the user cache while the user's version token is
+    unchanged. Sessions whose session_version no longer matches the user's are
+    treated as logged out.
+    """
+    user_id = int(user_id)
+    # Read the version before the row, so a change committed in between is caught next time
+    version = cache.get(user_version_key(user_id))
+    entry = user_cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        # Attach a copy of the cached row to this request's session without querying
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        user = db.session.merge(user, load=False)
+    else:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        user_cache.set(user_id, (version, {column.key: getattr(user, column.key)
+                                           for column in User.__table__.columns}))
+    if user.session_version != session.get('session_version', 0):
+        return None
+    return user
 
 
 # Helper function to check allowed file extensions
@@ -120,6 +146,93 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+def acquire_stored_file(sha256, path, size):
+    """Take a reference on a stored file, registering it on first use."""
+    referenced = db.session.execute(
+        update(StoredFile).where(StoredFile.sha256 == sha256)
+        .values(ref_count=StoredFile.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if referenced:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(StoredFile(sha256=sha256, path=path, size=size, ref_count=1))
+    except IntegrityError:
+        # A concurrent upload of the same content registered it first
+        acquire_stored_file(sha256, path, size)
+
+
+def release_stored_file(sha256):
+    """
+    Drop a reference on a stored file. Returns the file's relative path if this
+    was the last reference, otherwise None; the row stays behind with ref_count 0
+    and the caller passes the path to purge_stored_file after committing.
+    """
+    stored_file = db.session.get(StoredFile, sha256)
+    if stored_file is None:
+        return None
+    path = stored_file.path
+    db.session.execute(
+        update(StoredFile).where(StoredFile.sha256 == sha256)
+        .values(ref_count=StoredFile.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    remaining = db.session.query(StoredFile.ref_count).filter(StoredFile.sha256 == sha256).scalar()
+    return path if remaining <= 0 else None
+
+
+def purge_stored_file(sha256, path):
+    """
+    Delete an unreferenced stored file's row and unlink the file in one transaction.
+    The row delete holds the write lock until the unlink is done, so an upload's
+    acquire_stored_file waits for it and then moves its own copy into place; a
+    reference taken before the delete leaves the row and the file alone.
+    """
+    removed = db.session.execute(
+        delete(StoredFile).where(StoredFile.sha256 == sha256, StoredFile.ref_count <= 0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    try:
+        if removed:
+            remove_stored_file(app.config['UPLOAD_FOLDER'], path)
+    except OSError:
+        # Keep the row (ref_count 0) so the file is not orphaned; the next upload or delete retries
+        db.session.rollback()
+        raise
+    db.session.commit()
+
+
+def save_game_manifest(game):
+    """
+    Replace the game's GameFile rows with the members listed in its ZIP's central
+    directory (nothing is extracted) and update the summary columns. Caller commits.
+    """
+    path = os.path.join(app.config['UPLOAD_FOLDER'], game.filename)
+    try:
+        entries, entry_point = read_manifest(path)
+    except (zipfile.BadZipFile, OSError):
+        entries, entry_point = None, None
+
+    db.session.execute(delete(GameFile).where(GameFile.game_id == game.id))
+    if entries:
+        db.session.execute(insert(GameFile), [dict(entry, game_id=game.id) for entry in entries])
+    game.file_count = len(entries) if entries is not None else None
+    game.uncompressed_size = sum(entry['size'] for entry in entries) if entries is not None else None
+    game.entry_point = entry_point
+    game.manifest_indexed_at = datetime.utcnow()
+
+
+@app.template_filter('filesize')
+def filesize(num_bytes):
+    """Human-readable byte count, e.g. 1536 -> "1.5 KB"."""
+    for unit in ('B', 'KB', 'MB'):
+        if num_bytes < 1024:
+            return f'{num_bytes} {unit}' if unit == 'B' else f'{num_bytes:.1f} {unit}'
+        num_bytes /= 1024
+    return f'{num_bytes:.1f} GB'
+
+
 # Helper function to validate redirect URLs (prevents open redirect attacks)
 def is_safe_url(target):
     """
@@ -133,6 +246,26 @@ def is_safe_url(target):
     return test_url.scheme in ('http', 'https') and ref_url.netloc == test_url.netloc
 
 
+def redirect_back(default='index'):
+    """Redirect to the referring page when it is on this site, otherwise to the default endpoint."""
+    if is_safe_url(request.referrer):
+        return redirect(request.referrer)
+    return redirect(url_for(default))
+
+
+def rate_limit_client():
+    """Identify the client for throttling: the logged-in user's id, else the remote address."""
+    # Flask-Login keeps the user id in the session; reading it directly avoids loading the user
+    user_id = session.get('_user_id')
+    return f'user:{user_id}' if user_id else f'ip:{request.remote_addr}'
+
+
+def allow_comment_post():
+    """Count a comment submission against the client's window; False if it is over the limit."""
+    return rate_limiter.hit(f'comment:{rate_limit_client()}',
+                            app.config['COMMENT_RATE_LIMIT'], app.config['COMMENT_RATE_WINDOW'])
+
+
 def record_tag_change(comment, old_tag, new_tag, changed_by_user_id=None, changed_by='system'):
     """Record tag change in history."""
     history = CommentTagHistory(
@@ -145,21 +278,367 @@ def record_tag_change(comment, old_tag, new_tag, changed_by_user_id=None, change
     db.session.add(history)
 
 
-def auto_restore_hidden_comments(comments):
-    """Auto-restore comments that have been hidden for 7+ days."""
+def sweep_hidden_comments():
+    """
+    Auto-restore every comment that has been hidden for 7+ days.
+    Uses one set-based UPDATE plus one bulk INSERT into the tag history, so read
+    views never have to write. Returns the number of restored comments.
+    """
     now = datetime.utcnow()
+    expired = and_(Comment.tag == 'hidden', Comment.hidden_at <= now - timedelta(days=7))
+    restore = update(Comment).where(expired).values(
+        tag=Comment.original_tag, hidden_at=None
+    ).execution_options(synchronize_session=False)
+
+    if db.engine.dialect.update_returning:
+        # The UPDATE itself claims the rows, so concurrent sweepers never record a change twice
+        restored = db.session.execute(
+            restore.returning(Comment.id, Comment.tag, Comment.target_type, Comment.game_id)
+        ).all()
+    else:
+        candidates = db.session.query(
+            Comment.id, Comment.original_tag, Comment.target_type, Comment.game_id
+        ).filter(expired).all()
+        # Claim each row with an UPDATE that still requires it to be hidden and expired: a row another
+        # worker's sweeper restored since the SELECT matches nothing and gets no second history entry
+        restored = [row for row in candidates if db.session.execute(restore.where(Comment.id == row[0])).rowcount]
+
+    if restored:
+        db.session.execute(CommentTagHistory.__table__.insert(), [
+            {'comment_id': comment_id, 'old_tag': 'hidden', 'new_tag': new_tag,
+             'changed_by_user_id': None, 'changed_by': 'system', 'changed_at': now}
+            for comment_id, new_tag, _, _ in restored
+        ])
+    db.session.commit()
+
+    for target_type, game_id in {(target_type, game_id) for _, _, target_type, game_id in restored}:
+        bump_comment_version(target_type, game_id if target_type == 'game' else None)
+    return len(restored)
+
+
+def start_hidden_comment_sweeper(interval):
+    """Run sweep_hidden_comments shortly after start, then every interval seconds, in a daemon thread."""
+    def run():
+        # Sweep once soon after start: a worker recycled by gunicorn's max_requests may never live a
+        # full interval. The jitter keeps workers that boot together from sweeping together.
+        time.sleep(random.uniform(0, min(interval, 60)))
+        while True:
+            with app.app_context():
+                try:
+                    restored = sweep_hidden_comments()
+                    if restored:
+                        print(f'[Sweeper] Restored {restored} hidden comments')
+                except Exception as e:
+                    db.session.rollback()
+                    print(f'[Sweeper] Hidden comment sweep failed: {e}')
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='hidden-comment-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+def load_comment_tree(query):
+    """
+    Load every comment matched by query in a single SELECT and build the reply tree in memory.
+
+    Authors are joined in and report counts are stored on the comment itself, so
+    walking comment.replies, comment.author and comment.report_count afterwards
+    issues no further queries regardless of thread size or depth.
+    Returns the top-level comments ordered by created_at.
+    """
+    comments = query.options(
+        joinedload(Comment.author)
+    ).order_by(Comment.created_at.asc(), Comment.id.asc()).all()
+
+    children = {comment.id: [] for comment in comments}
+
+    roots = []
+    for comment in comments:
+        siblings = children.get(comment.parent_id)
+        if siblings is None:
+            roots.append(comment)
+        else:
+            siblings.append(comment)
+
+    # Populate the relationship without marking it dirty or triggering a lazy load
     for comment in comments:
-        if comment.tag == 'hidden' and comment.hidden_at:
-            days_hidden = (now - comment.hidden_at).days
-            if days_hidden >= 7:
-                # Restore original tag
-                old_tag = comment.tag
-                comment.tag = comment.original_tag
-                comment.hidden_at = None
-                record_tag_change(comment, old_tag, comment.tag, changed_by='system')
-        # Recursively check replies
+        set_committed_value(comment, 'replies', children[comment.id])
+
+    return roots
+
+
+def filter_comments(comment_list, show_deleted=False, show_hidden=False):
+    """
+    Drop deleted and hidden comments (and their replies) that the viewer may not see.
+
+    Deleted comments are only kept when show_deleted is set (admins), hidden ones
+    only when show_hidden is set (game authors). Replies are filtered recursively.
+    """
+    filtered = []
+    for comment in comment_list:
+        if comment.is_deleted and not show_deleted:
+            continue
+        if comment.tag == 'hidden' and not show_hidden:
+            continue
+        filtered.append(comment)
         if comment.replies:
-            auto_restore_hidden_comments(comment.replies)
+            set_committed_value(comment, 'replies',
+                                filter_comments(comment.replies, show_deleted, show_hidden))
+    return filtered
+
+
+def apply_comment_filters(query, tag_filter, show_deleted=False, show_hidden=False):
+    """Apply the tag filter and visibility rules to a query of top-level comments."""
+    if tag_filter == 'no_tag':
+        query = query.filter(Comment.tag.is_(None))
+    elif tag_filter and tag_filter != 'all':
+        query = query.filter_by(tag=tag_filter)
+    if not show_deleted:
+        query = query.filter(Comment.is_deleted == False)
+    if not show_hidden:
+        query = query.filter(or_(Comment.tag.is_(None), Comment.tag != 'hidden'))
+    return query
+
+
+def encode_cursor(item):
+    """Encode an item's (created_at, id) position as a URL-safe keyset cursor."""
+    return f"{item.created_at.strftime('%Y%m%d%H%M%S%f')}-{item.id}"
+
+
+def decode_cursor(cursor):
+    """Decode a keyset cursor into (created_at, id), or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        timestamp, item_id = cursor.split('-', 1)
+        return datetime.strptime(timestamp, '%Y%m%d%H%M%S%f'), int(item_id)
+    except ValueError:
+        return None
+
+
+def keyset_query(query, model, position=None, descending=False):
+    """
+    Order query by (created_at, id) and, if position is given, keep only the rows
+    after that (created_at, id) position in the chosen direction.
+    """
+    if position:
+        created_at, item_id = position
+        if descending:
+            query = query.filter(or_(model.created_at < created_at,
+                                     and_(model.created_at == created_at, model.id < item_id)))
+        else:
+            query = query.filter(or_(model.created_at > created_at,
+                                     and_(model.created_at == created_at, model.id > item_id)))
+
+    if descending:
+        return query.order_by(model.created_at.desc(), model.id.desc())
+    return query.order_by(model.created_at.asc(), model.id.asc())
+
+
+def paginate_keyset(query, model, per_page, after=None, before=None, descending=False):
+    """
+    Keyset (cursor) pagination on (created_at, id).
+    Pages are fetched with an indexed range condition instead of OFFSET, so deep
+    pages cost the same as the first one. Returns (items, prev_cursor, next_cursor).
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before) if not after else None
+    # "forward" means the display order; going back to a previous page reads in reverse
+    forward = before is None
+    position = after or before
+
+    query = keyset_query(query, model, position, descending=(descending == forward))
+    items = query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    if forward:
+        has_next, has_prev = has_more, position is not None
+    else:
+        items.reverse()
+        has_next, has_prev = True, has_more
+
+    prev_cursor = encode_cursor(items[0]) if items and has_prev else None
+    next_cursor = encode_cursor(items[-1]) if items and has_next else None
+    return items, prev_cursor, next_cursor
+
+
+def load_comment_page(root_query, show_deleted=False, show_hidden=False):
+    """
+    Load one keyset page of top-level comments plus all of their replies.
+    Replies are fetched with one query over the roots' thread_path ranges.
+    Returns (comments, prev_cursor, next_cursor).
+    """
+    roots, prev_cursor, next_cursor = paginate_keyset(
+        root_query, Comment, app.config['COMMENTS_PER_PAGE'],
+        after=request.args.get('after'), before=request.args.get('before')
+    )
+    if not roots:
+        return [], prev_cursor, next_cursor
+
+    subtrees = or_(*[
+        and_(Comment.thread_path >= root.thread_path, Comment.thread_path < root.thread_path + '~')
+        for root in roots
+    ])
+    comments = load_comment_tree(Comment.query.filter(subtrees))
+    comments = filter_comments(comments, show_deleted=show_deleted, show_hidden=show_hidden)
+    return comments, prev_cursor, next_cursor
+
+
+def anonymous_page_etag(*validators):
+    """
+    Build an ETag for a public page from cheap validators, or None when the page
+    is personalized (logged-in user or pending flash messages) and must not be revalidated.
+    """
+    if current_user.is_authenticated or '_flashes' in session:
+        return None
+    parts = [str(validator) for validator in validators]
+    parts.append(get_comment_version('authors'))  # Usernames are rendered into public pages
+    parts.append(request.query_string.decode('utf-8', 'replace'))
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def not_modified(etag):
+    """Return a 304 response if the client's cached copy matches, otherwise None."""
+    # ETag only: it covers deletions and renames, which no Last-Modified date would move
+    if etag and not is_resource_modified(request.environ, etag=etag):
+        response = app.response_class(status=304)
+        return with_validators(response, etag)
+    return None
+
+
+def with_validators(response, etag):
+    """Attach an ETag so anonymous clients revalidate instead of refetching."""
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+    return response
+
+
+def comment_version_key(target_type, target_id=None):
+    """Cache key of the version token for a comment target ('game' + game id, 'request', or 'authors')."""
+    return f'comment_version:{target_type}:{target_id or ""}'
+
+
+def get_comment_version(target_type, target_id=None):
+    """Return the current version token for a comment target."""
+    key = comment_version_key(target_type, target_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version)
+    return version
+
+
+def bump_comment_version(target_type, target_id=None):
+    """Invalidate cached thread fragments for a target; call after committing a change."""
+    cache.set(comment_version_key(target_type, target_id), uuid.uuid4().hex)
+
+
+def bump_comment_version_for(comment):
+    """Invalidate cached thread fragments for the target a comment belongs to."""
+    if comment.target_type == 'game':
+        bump_comment_version('game', comment.game_id)
+    else:
+        bump_comment_version(comment.target_type)
+
+
+def render_comment_fragment(template_name, target_type, target_id, root_query, tag_filter,
+                            is_author=False, is_admin=False, show_deleted=False, show_hidden=False,
+                            **context):
+    """
+    Render one page of a comment thread, serving it from the fragment cache while
+    the target's version is unchanged (and for at most FRAGMENT_CACHE_TTL seconds).
+    The key covers the viewer class (author with/without show_hidden, admin
+    with/without show_deleted, everyone else), the tag filter and the page position.
+    """
+    # Decoded the same way paginate_keyset does, so malformed cursors share the first page's entry
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before')) if not after else None
+    key = '|'.join([
+        template_name, target_type, str(target_id),
+        f'author={int(is_author)}:hidden={int(show_hidden)}:admin={int(is_admin)}:deleted={int(show_deleted)}',
+        tag_filter, f'after={after}', f'before={before}',
+        get_comment_version(target_type, target_id), get_comment_version('authors')
+    ])
+    html = fragment_cache.get(key)
+    if html is None:
+        comments, prev_cursor, next_cursor = load_comment_page(root_query, show_deleted, show_hidden)
+        html = render_template(template_name, comments=comments, tag_filter=tag_filter,
+                               is_author=is_author, is_admin=is_admin,
+                               show_deleted=show_deleted, show_hidden=show_hidden,
+                               prev_cursor=prev_cursor, next_cursor=next_cursor, **context)
+        fragment_cache.set(key, html, ttl=app.config['FRAGMENT_CACHE_TTL'])
+    return Markup(html)
+
+
+def recent_report_query(comment_id, reporter_user_id, reporter_ip):
+    """Query reports of a comment by the same reporter within the last 24 hours."""
+    time_threshold = datetime.utcnow() - timedelta(hours=24)
+    if reporter_user_id:
+        # For logged-in users, check by user_id
+        reporter_filter = Report.reporter_user_id == reporter_user_id
+    else:
+        # For guests, check by IP address
+        reporter_filter = Report.reporter_ip == reporter_ip
+    return Report.query.filter(
+        Report.comment_id == comment_id,
+        reporter_filter,
+        Report.created_at >= time_threshold
+    )
+
+
+def reported_comments_query(status_filter, sort_by, order_by):
+    """Build the admin reports dashboard query from the denormalized report aggregates."""
+    # Base query: comments with reports
+    query = Comment.query.filter(Comment.report_count > 0).options(
+        joinedload(Comment.author),
+        joinedload(Comment.game),
+        joinedload(Comment.report_resolved_by)
+    )
+
+    # Apply status filter
+    if status_filter == 'unresolved':
+        query = query.filter(Comment.is_report_resolved == False)
+    elif status_filter == 'resolved':
+        query = query.filter(Comment.is_report_resolved == True)
+    # 'all' shows both resolved and unresolved
+
+    # Apply sorting
+    if sort_by == 'count':
+        # Sort by report count
+        sort_column = Comment.report_count
+    else:  # sort_by == 'latest'
+        # Sort by latest report time
+        sort_column = Comment.latest_report_at
+    if order_by == 'asc':
+        query = query.order_by(sort_column.asc(), Comment.id.asc())
+    else:
+        query = query.order_by(sort_column.desc(), Comment.id.desc())
+
+    return query
+
+
+REPORT_COUNT_CACHE_KEY = 'unresolved_reported_comment_count'
+
+
+def get_unresolved_report_count():
+    """Return the number of reported comments awaiting review, cached between invalidations."""
+    count = cache.get(REPORT_COUNT_CACHE_KEY)
+    if count is None:
+        count = Comment.query.filter(
+            Comment.is_report_resolved == False,
+            Comment.report_count > 0
+        ).count()
+        cache.set(REPORT_COUNT_CACHE_KEY, count, ttl=app.config['REPORT_COUNT_CACHE_TTL'])
+    return count
+
+
+def invalidate_report_count():
+    """Drop the cached unresolved report count; call after committing a change that affects it."""
+    cache.delete(REPORT_COUNT_CACHE_KEY)
 
 
 def admin_required(f):
@@ -245,7 +724,13 @@ def login():
         user = User.query.filter_by(username=username).first()
 
         if user and user.check_password(password):
+            # Transparently upgrade hashes made with a different work factor
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+                invalidate_cached_user(user.id)
             login_user(user)
+            session['session_version'] = user.session_version
             flash(f'Welcome back, {user.username}!', 'success')
             # Validate redirect URL to prevent open redirect attacks
             next_page = request.args.get('next')
@@ -305,6 +790,9 @@ def change_username():
     old_username = current_user.username
     current_user.username = new_username
     db.session.commit()
+    invalidate_cached_user(current_user.id)
+    # Usernames are rendered into every cached comment thread
+    bump_comment_version('authors')
 
     flash(f'Username successfully changed from "{old_username}" to "{new_username}".', 'success')
     return redirect(url_for('account'))
@@ -333,8 +821,12 @@ def change_password():
         return redirect(url_for('account'))
 
     # Update password
+    # Sign out every other session of this user; this one carries the new version
     current_user.set_password(new_password)
+    current_user.session_version += 1
     db.session.commit()
+    session['session_version'] = current_user.session_version
+    invalidate_cached_user(current_user.id)
 
     flash('Password successfully changed.', 'success')
     return redirect(url_for('account'))
@@ -347,8 +839,20 @@ def change_password():
 @app.route('/')
 def index():
     """Public game list page - anyone can view."""
-    games = Game.query.order_by(Game.created_at.desc()).all()
-    return render_template('index.html', games=games)
+    # Cheap validator for anonymous visitors: latest game change plus the game count (catches deletions)
+    game_count, last_change = db.session.query(func.count(Game.id), func.max(Game.updated_at)).one()
+    etag = anonymous_page_etag(game_count, last_change)
+    response = not_modified(etag)
+    if response:
+        return response
+
+    games, prev_cursor, next_cursor = paginate_keyset(
+        Game.query.options(joinedload(Game.uploader)), Game, app.config['GAMES_PER_PAGE'],
+        after=request.args.get('after'), before=request.args.get('before'), descending=True
+    )
+    response = make_response(render_template('index.html', games=games,
+                                             prev_cursor=prev_cursor, next_cursor=next_cursor))
+    return with_validators(response, etag)
 
 
 @app.route('/game/upload', methods=['GET', 'POST'])
@@ -374,22 +878,42 @@ def upload_game():
                 flash(error, 'error')
             return render_template('upload.html')
 
-        # Save file with secure filename
-        original_filename = secure_filename(file.filename)
-        # Create unique filename to avoid collisions
-        filename = f"{current_user.id}_{Game.query.count() + 1}_{original_filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Stream file to content-addressed storage (identical ZIPs are stored once). The reference
+        # is committed before the file is moved into place, so a concurrent delete of the same
+        # content either sees it and keeps the file, or unlinks first and our copy replaces it.
+        sha256, tmp_path, size = receive_upload(file.stream, app.config['UPLOAD_FOLDER'],
+                                                app.config['UPLOAD_CHUNK_SIZE'])
+        try:
+            acquire_stored_file(sha256, content_path(sha256), size)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            os.remove(tmp_path)
+            raise
+        filename = place_upload(tmp_path, app.config['UPLOAD_FOLDER'], sha256)
 
         # Create game record
-        game = Game(
-            title=title,
-            description=description,
-            filename=filename,
-            uploader_id=current_user.id
-        )
-        db.session.add(game)
-        db.session.commit()
+        try:
+            game = Game(
+                title=title,
+                description=description,
+                filename=filename,
+                file_sha256=sha256,
+                uploader_id=current_user.id
+            )
+            db.session.add(game)
+            db.session.flush()  # Assign id for the search index and manifest rows
+            index_game(game)
+            save_game_manifest(game)
+            db.session.commit()
+        except Exception:
+            # Give back the reference taken above
+            db.session.rollback()
+            unused_path = release_stored_file(sha256)
+            db.session.commit()
+            if unused_path:
+                purge_stored_file(sha256, unused_path)
+            raise
 
         flash(f'Game "{title}" uploaded successfully!', 'success')
         return redirect(url_for('game_detail', game_id=game.id))
@@ -400,6 +924,18 @@ def upload_game():
 @app.route('/game/<int:game_id>')
 def game_detail(game_id):
     """Game detail page - public, shows metadata and download button."""
+    # Cheap validator for anonymous visitors: latest change to the game or any of its comments
+    latest_comment_change = db.session.query(func.max(Comment.updated_at)).filter(
+        Comment.game_id == game_id
+    ).scalar_subquery()
+    validator = db.session.query(Game.updated_at, latest_comment_change).filter(Game.id == game_id).first()
+    if validator is None:
+        abort(404)
+    etag = anonymous_page_etag(*validator)
+    response = not_modified(etag)
+    if response:
+        return response
+
     game = Game.query.get_or_404(game_id)
 
     # Get filter parameters
@@ -411,63 +947,100 @@ def game_detail(game_id):
     is_author = current_user.is_authenticated and current_user.id == game.uploader_id
     is_admin = current_user.is_authenticated and current_user.is_admin
 
-    # Load all top-level comments
-    query = Comment.query.filter_by(game_id=game_id, parent_id=None)
-
-    # Apply tag filter
-    if tag_filter == 'no_tag':
-        query = query.filter(Comment.tag.is_(None))
-    elif tag_filter and tag_filter != 'all':
-        query = query.filter_by(tag=tag_filter)
-
-    comments = query.order_by(Comment.created_at.asc()).all()
-
-    # Auto-restore hidden comments (7-day rule)
-    auto_restore_hidden_comments(comments)
-    db.session.commit()
-
-    # Filter out hidden and deleted comments based on user role
-    def filter_comments(comment_list):
-        filtered = []
-        for comment in comment_list:
-            # Filter deleted comments (admin-only visibility)
-            if comment.is_deleted:
-                if is_admin and show_deleted:
-                    filtered.append(comment)
-                # Non-admins and admins without show_deleted flag: skip
-                continue
+    # Load one page of top-level comments with their whole reply threads
+    include_deleted = is_admin and show_deleted
+    include_hidden = is_author and show_hidden
+    query = apply_comment_filters(Comment.query.filter_by(game_id=game_id, parent_id=None),
+                                  tag_filter, include_deleted, include_hidden)
+    comments_html = render_comment_fragment('game_comments.html', 'game', game_id, query, tag_filter,
+                                            is_author, is_admin, include_deleted, include_hidden,
+                                            game=game)
 
-            # Filter hidden comments
-            if comment.tag == 'hidden':
-                if is_author and show_hidden:
-                    filtered.append(comment)
-                # Non-authors and authors without show_hidden flag: skip
-            else:
-                filtered.append(comment)
+    # First part of the ZIP manifest (the full list can be thousands of files)
+    manifest = GameFile.query.filter_by(game_id=game_id).order_by(GameFile.path).limit(
+        app.config['MANIFEST_DISPLAY_LIMIT']).all() if game.file_count else []
 
-            # Recursively filter replies
-            if comment.replies:
-                comment.replies = filter_comments(comment.replies)
-
-        return filtered
-
-    comments = filter_comments(comments)
-
-    return render_template('game_detail.html', game=game, comments=comments,
-                         tag_filter=tag_filter, show_hidden=show_hidden,
-                         show_deleted=show_deleted, is_author=is_author, is_admin=is_admin)
+    response = make_response(render_template('game_detail.html', game=game, comments_html=comments_html,
+                                             manifest=manifest,
+                                             tag_filter=tag_filter, show_hidden=show_hidden,
+                                             show_deleted=show_deleted, is_author=is_author, is_admin=is_admin))
+    return with_validators(response, etag)
 
 
 @app.route('/game/<int:game_id>/download')
 def download_game(game_id):
     """Download game ZIP file."""
     game = Game.query.get_or_404(game_id)
-    return send_from_directory(
-        app.config['UPLOAD_FOLDER'],
-        game.filename,
-        as_attachment=True,
-        download_name=f"{game.title}.zip"
-    )
+    download_name = f"{game.title}.zip"
+    max_age = app.config['DOWNLOAD_CACHE_MAX_AGE']
+
+    # Content-addressed uploads get their SHA-256 as a strong ETag
+    if app.config['DOWNLOAD_OFFLOAD'] != 'x-accel':
+        # Flask streams the file itself (or emits X-Sendfile when USE_X_SENDFILE is set),
+        # answering Range and If-None-Match/If-Modified-Since requests
+        return send_from_directory(
+            app.config['UPLOAD_FOLDER'],
+            game.filename,
+            as_attachment=True,
+            download_name=download_name,
+            etag=game.file_sha256 or True,
+            max_age=max_age
+        )
+
+    # Hand the transfer to nginx; only the conditional check runs in Python
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], game.filename)
+    if not os.path.isfile(filepath):
+        abort(404)
+    stat = os.stat(filepath)
+    etag = game.file_sha256 or f'{int(stat.st_mtime)}-{stat.st_size}'
+    last_modified = datetime.utcfromtimestamp(int(stat.st_mtime))
+
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(mimetype='application/zip')
+        response.headers['X-Accel-Redirect'] = app.config['X_ACCEL_REDIRECT_PREFIX'] + game.filename
+        response.headers['Content-Disposition'] = attachment_header(download_name)
+    else:
+        response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+
+@app.route('/game/<int:game_id>/file/<path:member_path>')
+def game_file(game_id, member_path):
+    """Stream one file from inside a game's ZIP (README, screenshots, source) without extracting it."""
+    member = db.session.query(
+        Game.filename, Game.file_sha256, GameFile.header_offset, GameFile.size, GameFile.compressed_size
+    ).join(GameFile, GameFile.game_id == Game.id).filter(
+        Game.id == game_id, GameFile.path == member_path
+    ).first()
+    if member is None:
+        abort(404)
+
+    # Stored ZIPs never change in place, so the member is identified by the archive and its path
+    etag = hashlib.sha1(f'{member.file_sha256 or member.filename}:{member_path}'.encode()).hexdigest()
+    if not is_resource_modified(request.environ, etag=etag):
+        response = app.response_class(status=304)
+    else:
+        try:
+            archive = archive_cache.get(os.path.join(app.config['UPLOAD_FOLDER'], member.filename))
+            chunks = archive.read_member(member.header_offset, member.compressed_size, member.size)
+        except (OSError, ValueError, zipfile.BadZipFile, NotImplementedError):
+            abort(404)
+        mimetype, inline = preview_type(member_path)
+        response = app.response_class(chunks, mimetype=mimetype, direct_passthrough=True)
+        response.content_length = member.size
+        if not inline:
+            response.headers['Content-Disposition'] = attachment_header(member_path.rsplit('/', 1)[-1])
+    # Uploaded content must never run as part of this site
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers['Content-Security-Policy'] = "default-src 'none'; sandbox"
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['DOWNLOAD_CACHE_MAX_AGE']
+    return response
 
 
 @app.route('/game/<int:game_id>/edit', methods=['GET', 'POST'])
@@ -491,6 +1064,7 @@ def edit_game(game_id):
 
         game.title = title
         game.description = description
+        index_game(game)
         db.session.commit()
 
         flash(f'Game "{title}" updated successfully!', 'success')
@@ -510,15 +1084,23 @@ def delete_game(game_id):
         flash('You do not have permission to delete this game.', 'error')
         abort(403)
 
-    # Delete file from filesystem
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], game.filename)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+    # Release the stored file; it is only unlinked when its last reference goes away
+    sha256 = game.file_sha256
+    unused_path = release_stored_file(sha256) if sha256 else None
+    legacy_filename = None if sha256 else game.filename  # Legacy upload stored under its own file name
 
-    # Delete database record
+    # Delete database record (and its search entries, including its comments')
+    unindex_game(game.id)
+    db.session.execute(delete(GameFile).where(GameFile.game_id == game.id))
     db.session.delete(game)
     db.session.commit()
 
+    # Delete file from filesystem (skipped if an identical upload took a reference since our commit)
+    if unused_path:
+        purge_stored_file(sha256, unused_path)
+    elif legacy_filename:
+        remove_stored_file(app.config['UPLOAD_FOLDER'], legacy_filename)
+
     flash('Game deleted successfully.', 'success')
     return redirect(url_for('index'))
 
@@ -526,6 +1108,11 @@ def delete_game(game_id):
 @app.route('/game/<int:game_id>/comment', methods=['POST'])
 def post_comment(game_id):
     """Post a comment or reply to a game - open to both users and guests."""
+    # Throttle bursts before touching the database
+    if not allow_comment_post():
+        flash('You are posting too quickly. Please wait a moment and try again.', 'error')
+        return redirect(url_for('game_detail', game_id=game_id))
+
     game = Game.query.get_or_404(game_id)
 
     content = request.form.get('content', '').strip()
@@ -548,6 +1135,7 @@ def post_comment(game_id):
         return redirect(url_for('game_detail', game_id=game_id))
 
     # Validate parent_id if provided
+    parent_comment = None
     if parent_id:
         try:
             parent_id = int(parent_id)
@@ -567,11 +1155,16 @@ def post_comment(game_id):
         game_id=game_id,
         user_id=current_user.id if current_user.is_authenticated else None,
         guest_name='guest',  # Always 'guest' for non-authenticated users
+        author_ip=None if current_user.is_authenticated else request.remote_addr,
         parent_id=parent_id
     )
 
     db.session.add(comment)
+    db.session.flush()  # Assign id before building the thread path
+    comment.set_thread_path(parent_comment)
+    index_comment(comment)
     db.session.commit()
+    bump_comment_version('game', game_id)
 
     flash('Comment posted successfully!', 'success')
     return redirect(url_for('game_detail', game_id=game_id))
@@ -620,6 +1213,7 @@ def change_comment_tag(game_id, comment_id):
     record_tag_change(comment, old_tag, new_tag, current_user.id, f'user_{current_user.id}')
 
     db.session.commit()
+    bump_comment_version('game', game_id)
 
     flash('Comment tag updated successfully!', 'success')
     return redirect(url_for('game_detail', game_id=game_id))
@@ -641,6 +1235,8 @@ def delete_comment(comment_id):
     comment.delete_reason = reason
 
     db.session.commit()
+    invalidate_report_count()
+    bump_comment_version_for(comment)
 
     flash('Comment deleted successfully.', 'success')
 
@@ -664,6 +1260,8 @@ def restore_comment(comment_id):
     comment.delete_reason = None
 
     db.session.commit()
+    invalidate_report_count()
+    bump_comment_version_for(comment)
 
     flash('Comment restored successfully.', 'success')
 
@@ -688,49 +1286,26 @@ def requests_board():
     # Check if current user is admin
     is_admin = current_user.is_authenticated and current_user.is_admin
 
-    # Load all top-level requests board comments
-    query = Comment.query.filter_by(target_type='request', parent_id=None)
-
-    # Apply tag filter
-    if tag_filter == 'no_tag':
-        query = query.filter(Comment.tag.is_(None))
-    elif tag_filter and tag_filter != 'all':
-        query = query.filter_by(tag=tag_filter)
-
-    comments = query.order_by(Comment.created_at.asc()).all()
+    # Load one page of top-level posts with their whole reply threads
+    # (no author concept on requests board, so hidden posts are hidden from everyone)
+    include_deleted = is_admin and show_deleted
+    query = apply_comment_filters(Comment.query.filter_by(target_type='request', parent_id=None),
+                                  tag_filter, include_deleted)
+    comments_html = render_comment_fragment('request_comments.html', 'request', None, query, tag_filter,
+                                            is_admin=is_admin, show_deleted=include_deleted)
 
-    # Auto-restore hidden comments (7-day rule)
-    auto_restore_hidden_comments(comments)
-    db.session.commit()
-
-    # Filter out hidden and deleted comments
-    def filter_comments(comment_list):
-        filtered = []
-        for comment in comment_list:
-            # Filter deleted comments (admin-only visibility)
-            if comment.is_deleted:
-                if is_admin and show_deleted:
-                    filtered.append(comment)
-                # Non-admins and admins without show_deleted flag: skip
-                continue
-
-            # Filter hidden comments (no author concept on requests board, so hide from everyone)
-            if comment.tag != 'hidden':
-                filtered.append(comment)
-                # Recursively filter replies
-                if comment.replies:
-                    comment.replies = filter_comments(comment.replies)
-        return filtered
-
-    comments = filter_comments(comments)
-
-    return render_template('requests.html', comments=comments, tag_filter=tag_filter,
+    return render_template('requests.html', comments_html=comments_html, tag_filter=tag_filter,
                          show_deleted=show_deleted, is_admin=is_admin)
 
 
 @app.route('/requests/comment', methods=['POST'])
 def post_request_comment():
     """Post a comment or reply on the requests board - open to both users and guests."""
+    # Throttle bursts before touching the database
+    if not allow_comment_post():
+        flash('You are posting too quickly. Please wait a moment and try again.', 'error')
+        return redirect(url_for('requests_board'))
+
     content = request.form.get('content', '').strip()
     tag = request.form.get('tag', '').strip() or None  # Allow empty tag
     parent_id = request.form.get('parent_id', None)
@@ -751,6 +1326,7 @@ def post_request_comment():
         return redirect(url_for('requests_board'))
 
     # Validate parent_id if provided
+    parent_comment = None
     if parent_id:
         try:
             parent_id = int(parent_id)
@@ -770,16 +1346,58 @@ def post_request_comment():
         game_id=None,  # No game association
         user_id=current_user.id if current_user.is_authenticated else None,
         guest_name='guest',  # Always 'guest' for non-authenticated users
+        author_ip=None if current_user.is_authenticated else request.remote_addr,
         parent_id=parent_id
     )
 
     db.session.add(comment)
+    db.session.flush()  # Assign id before building the thread path
+    comment.set_thread_path(parent_comment)
+    index_comment(comment)
     db.session.commit()
+    bump_comment_version('request')
 
     flash('Comment posted successfully!', 'success')
     return redirect(url_for('requests_board'))
 
 
+# ============================================================================
+# SEARCH ROUTES
+# ============================================================================
+
+@app.route('/search')
+def search():
+    """Full-text search over games and comments - public, ranked, keyset-paginated."""
+    terms = request.args.get('q', '').strip()
+    per_page = app.config['SEARCH_RESULTS_PER_PAGE']
+    rows = search_rows(terms, per_page + 1, after=decode_search_cursor(request.args.get('after')))
+    next_cursor = encode_search_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    rows = rows[:per_page]
+
+    # Load the matched games and comments with one primary-key query each
+    game_ids = [row.rowid // 2 for row in rows if row.rowid % 2 == 0]
+    comment_ids = [row.rowid // 2 for row in rows if row.rowid % 2 == 1]
+    games = {game.id: game for game in Game.query.options(joinedload(Game.uploader))
+             .filter(Game.id.in_(game_ids))} if game_ids else {}
+    comments = {comment.id: comment for comment in Comment.query.options(joinedload(Comment.author))
+                .filter(Comment.id.in_(comment_ids))} if comment_ids else {}
+    # search_rows only checks the matched comment itself; replies under a deleted or hidden parent drop out here
+    visible = visible_comment_ids(list(comments.values()))
+    comments = {comment_id: comment for comment_id, comment in comments.items() if comment_id in visible}
+
+    results = []
+    for row in rows:
+        if row.rowid % 2 == 0:
+            kind, item = 'game', games.get(row.rowid // 2)
+        else:
+            kind, item = 'comment', comments.get(row.rowid // 2)
+        if item is not None:
+            results.append({'kind': kind, 'item': item, 'excerpt': highlight_excerpt(row.excerpt)})
+
+    return render_template('search.html', terms=terms, results=results, next_cursor=next_cursor,
+                           search_available=search_available())
+
+
 # ============================================================================
 # COMMENT REPORT ROUTES
 # ============================================================================
@@ -787,6 +1405,16 @@ def post_request_comment():
 @app.route('/comment/<int:comment_id>/report', methods=['POST'])
 def report_comment(comment_id):
     """Report a comment - anyone can report including guests."""
+    # Reject floods and repeats seen by the limiter before any SQL runs
+    reporter = rate_limit_client()
+    if not rate_limiter.hit(f'report:{reporter}', app.config['REPORT_RATE_LIMIT'], app.config['REPORT_RATE_WINDOW']):
+        flash('You are sending reports too quickly. Please wait a while and try again.', 'warning')
+        return redirect_back()
+    # One report per comment per reporter in 24 hours; a miss here (restart, other worker) falls back to the query below
+    if not rate_limiter.hit(f'report:{comment_id}:{reporter}', 1, 24 * 60 * 60):
+        flash('You have already reported this comment recently.', 'warning')
+        return redirect_back()
+
     comment = Comment.query.get_or_404(comment_id)
 
     # Get reporter information
@@ -799,35 +1427,29 @@ def report_comment(comment_id):
         reason = reason[:200]  # Truncate to 200 characters
 
     # Check for duplicate reports within 24 hours
-    time_threshold = datetime.utcnow() - timedelta(hours=24)
-
-    if reporter_user_id:
-        # For logged-in users, check by user_id
-        existing_report = Report.query.filter(
-            Report.comment_id == comment_id,
-            Report.reporter_user_id == reporter_user_id,
-            Report.created_at >= time_threshold
-        ).first()
-    else:
-        # For guests, check by IP address
-        existing_report = Report.query.filter(
-            Report.comment_id == comment_id,
-            Report.reporter_ip == reporter_ip,
-            Report.created_at >= time_threshold
-        ).first()
+    existing_report = recent_report_query(comment_id, reporter_user_id, reporter_ip).first()
 
     if existing_report:
         flash('You have already reported this comment recently.', 'warning')
     else:
         # Create new report
+        now = datetime.utcnow()
         new_report = Report(
             comment_id=comment_id,
             reporter_user_id=reporter_user_id,
             reporter_ip=reporter_ip,
-            reason=reason
+            reason=reason,
+            created_at=now
         )
         db.session.add(new_report)
+
+        # Keep the denormalized aggregates current (incremented in SQL to stay correct under concurrency)
+        comment.report_count = Comment.report_count + 1
+        comment.latest_report_at = now
+        comment.latest_report_reason = reason
         db.session.commit()
+        invalidate_report_count()
+        bump_comment_version_for(comment)
         flash('Comment reported. Thank you for helping maintain our community.', 'success')
 
     # Redirect back to the appropriate page
@@ -849,6 +1471,7 @@ def resolve_report(comment_id):
     comment.report_resolved_by_user_id = current_user.id
 
     db.session.commit()
+    invalidate_report_count()
     flash('Reports marked as resolved.', 'success')
 
     return redirect(url_for('admin_reports'))
@@ -866,82 +1489,528 @@ def unresolve_report(comment_id):
     comment.report_resolved_by_user_id = None
 
     db.session.commit()
+    invalidate_report_count()
     flash('Reports marked as unresolved.', 'success')
 
     return redirect(url_for('admin_reports'))
 
 
+def bulk_selection_criteria(form):
+    """
+    SQL criteria for the comments a bulk action applies to: the checked comment ids,
+    or else the filters (guest IP, author user id, unresolved with at least N reports).
+    Returns None when nothing was selected, so a bulk action can never hit every comment.
+    """
+    comment_ids = [int(value) for value in form.getlist('comment_ids') if value.isdigit()]
+    if comment_ids:
+        return [Comment.id.in_(comment_ids)]
+
+    criteria = []
+    author_ip = form.get('author_ip', '').strip()
+    if author_ip:
+        criteria.append(Comment.author_ip == author_ip)
+    author_user_id = form.get('author_user_id', '').strip()
+    if author_user_id.isdigit():
+        criteria.append(Comment.user_id == int(author_user_id))
+    min_reports = form.get('min_reports', '').strip()
+    if min_reports.isdigit() and int(min_reports) > 0:
+        criteria.extend([Comment.is_report_resolved == False, Comment.report_count >= int(min_reports)])
+    return criteria or None
+
+
+def bulk_update_comments(criteria, values):
+    """
+    Apply values to every comment matching criteria with one UPDATE (caller commits).
+    Returns the (target_type, game_id) of each changed comment for cache invalidation.
+    """
+    statement = update(Comment).where(*criteria).values(**values).execution_options(synchronize_session=False)
+    if db.engine.dialect.update_returning:
+        return db.session.execute(statement.returning(Comment.target_type, Comment.game_id)).all()
+    affected = db.session.query(Comment.id, Comment.target_type, Comment.game_id).filter(*criteria).all()
+    if affected:
+        db.session.execute(statement.where(Comment.id.in_([row.id for row in affected])))
+    return [(row.target_type, row.game_id) for row in affected]
+
+
+@app.route('/admin/comments/bulk', methods=['POST'])
+@admin_required
+def bulk_moderate_comments():
+    """Delete, restore, resolve or unresolve many comments in one transaction - admin only."""
+    action = request.form.get('action')
+    criteria = bulk_selection_criteria(request.form)
+    # Return to the dashboard view the admin came from
+    back = redirect(url_for('admin_reports', status=request.form.get('status', 'unresolved'),
+                            sort=request.form.get('sort', 'latest'), order=request.form.get('order', 'desc')))
+
+    if criteria is None:
+        flash('Select comments or enter a filter first.', 'error')
+        return back
+
+    now = datetime.utcnow()
+    # Each action only touches comments not already in the target state
+    if action == 'delete':
+        criteria.append(Comment.is_deleted == False)
+        values = {'is_deleted': True, 'deleted_at': now, 'deleted_by_user_id': current_user.id,
+                  'delete_reason': request.form.get('reason', '').strip()[:200] or None}
+        done = 'deleted'
+    elif action == 'restore':
+        criteria.append(Comment.is_deleted == True)
+        values = {'is_deleted': False, 'deleted_at': None, 'deleted_by_user_id': None, 'delete_reason': None}
+        done = 'restored'
+    elif action == 'resolve':
+        # Only reported comments: a filter also matches never-reported ones, which a later report must find unresolved
+        criteria.extend([Comment.report_count > 0, Comment.is_report_resolved == False])
+        values = {'is_report_resolved': True, 'report_resolved_at': now,
+                  'report_resolved_by_user_id': current_user.id}
+        done = 'marked as resolved'
+    elif action == 'unresolve':
+        criteria.extend([Comment.report_count > 0, Comment.is_report_resolved == True])
+        values = {'is_report_resolved': False, 'report_resolved_at': None, 'report_resolved_by_user_id': None}
+        done = 'marked as unresolved'
+    else:
+        flash('Unknown bulk action.', 'error')
+        return back
+
+    affected = bulk_update_comments(criteria, values)
+    db.session.commit()
+    invalidate_report_count()
+    if action in ('delete', 'restore'):
+        for target_type, game_id in set(affected):
+            bump_comment_version(target_type, game_id if target_type == 'game' else None)
+
+    flash(f'{len(affected)} comments {done}.', 'success')
+    return back
+
+
 @app.route('/admin/reports')
 @admin_required
 def admin_reports():
     """Admin page to view all reported comments with filtering and sorting."""
-    from sqlalchemy import func, desc, asc
-
     # Get query parameters
     status_filter = request.args.get('status', 'unresolved')  # unresolved, resolved, all
     sort_by = request.args.get('sort', 'latest')  # latest, count
     order_by = request.args.get('order', 'desc')  # desc, asc
 
-    # Base query: comments with reports, with report counts and latest report time
-    query = db.session.query(
-        Comment,
-        func.count(Report.id).label('report_count'),
-        func.max(Report.created_at).label('latest_report_at')
-    ).join(Report).group_by(Comment.id)
-
-    # Apply status filter
-    if status_filter == 'unresolved':
-        query = query.filter(Comment.is_report_resolved == False)
-    elif status_filter == 'resolved':
-        query = query.filter(Comment.is_report_resolved == True)
-    # 'all' shows both resolved and unresolved
-
-    # Apply sorting
-    if sort_by == 'count':
-        # Sort by report count
-        if order_by == 'asc':
-            query = query.order_by(asc(func.count(Report.id)))
-        else:
-            query = query.order_by(desc(func.count(Report.id)))
-    else:  # sort_by == 'latest'
-        # Sort by latest report time
-        if order_by == 'asc':
-            query = query.order_by(asc(func.max(Report.created_at)))
-        else:
-            query = query.order_by(desc(func.max(Report.created_at)))
-
-    reported_comments = query.all()
-
-    # Get latest report reason for each comment
-    comments_with_reasons = []
-    for comment, report_count, latest_report_at in reported_comments:
-        # Get the latest report for this comment
-        latest_report = Report.query.filter_by(comment_id=comment.id).order_by(
-            Report.created_at.desc()
-        ).first()
-        latest_reason = latest_report.reason if latest_report else None
-        comments_with_reasons.append((comment, report_count, latest_report_at, latest_reason))
+    reported_comments = reported_comments_query(status_filter, sort_by, order_by).all()
 
     return render_template('admin_reports.html',
-                         reported_comments=comments_with_reasons,
+                         reported_comments=reported_comments,
                          status_filter=status_filter,
                          sort_by=sort_by,
                          order_by=order_by)
 
 
+# Datasets available from the admin export endpoint
+EXPORT_DATASETS = {'reports': Report, 'comments': Comment, 'tag-history': CommentTagHistory}
+EXPORT_FORMATS = {'csv': ('text/csv', iter_csv), 'ndjson': ('application/x-ndjson', iter_ndjson)}
+
+
+@app.route('/admin/export/<dataset>.<fmt>')
+@admin_required
+def admin_export(dataset, fmt):
+    """Stream a moderation table as CSV or NDJSON - admin only. ?since=YYYY-MM-DD limits it to newer rows."""
+    if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    since = None
+    if request.args.get('since'):
+        try:
+            since = datetime.strptime(request.args['since'], '%Y-%m-%d')
+        except ValueError:
+            abort(400)
+
+    mimetype, serialize = EXPORT_FORMATS[fmt]
+    columns, batches = export_rows(db.session, EXPORT_DATASETS[dataset], since,
+                                   app.config['EXPORT_BATCH_SIZE'])
+    # Rows are fetched and written one batch at a time while the response streams
+    response = app.response_class(stream_with_context(serialize(columns, batches)), mimetype=mimetype)
+    filename = f"{dataset}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    response.headers['Content-Disposition'] = attachment_header(filename)
+    response.cache_control.no_store = True
+    return response
+
+
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    """Per-endpoint request metrics in Prometheus text format - admin only."""
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    response = app.response_class(request_metrics.render_prometheus(),
+                                  content_type='text/plain; version=0.0.4; charset=utf-8')
+    response.cache_control.no_store = True
+    return response
+
+
 # Context processor to provide report count to all templates
 @app.context_processor
 def inject_report_count():
     """Inject unresolved reported comment count for admin navigation badge."""
     if current_user.is_authenticated and current_user.is_admin:
-        # Count unique comments with at least one report and not resolved
-        from sqlalchemy import func
-        unresolved_count = db.session.query(func.count(func.distinct(Report.comment_id))).join(
-            Comment, Report.comment_id == Comment.id
-        ).filter(Comment.is_report_resolved == False).scalar() or 0
-        return {'reported_comment_count': unresolved_count}
+        return {'reported_comment_count': get_unresolved_report_count()}
     return {'reported_comment_count': 0}
 
 
+# ============================================================================
+# JSON API (v1, read-only)
+# ============================================================================
+
+def api_timestamp(value):
+    """ISO 8601 UTC timestamp for API payloads."""
+    return value.isoformat() + 'Z' if value else None
+
+
+def api_author(comment):
+    """Author of a comment: the account for logged-in posters, the guest name otherwise."""
+    if comment.user_id and comment.author:
+        return {'user_id': comment.author.id, 'username': comment.author.username}
+    return {'guest_name': comment.guest_name}
+
+
+def api_game(game, detail=False):
+    """Serialize a game (with its uploader joined in); detail adds the description and ZIP summary."""
+    data = {
+        'id': game.id,
+        'title': game.title,
+        'uploader': {'user_id': game.uploader.id, 'username': game.uploader.username},
+        'created_at': api_timestamp(game.created_at),
+        'updated_at': api_timestamp(game.updated_at),
+        'url': url_for('game_detail', game_id=game.id, _external=True),
+    }
+    if detail:
+        data.update({
+            'description': game.description,
+            'download_url': url_for('download_game', game_id=game.id, _external=True),
+            'sha256': game.file_sha256,
+            'file_count': game.file_count,
+            'uncompressed_size': game.uncompressed_size,
+            'entry_point': game.entry_point,
+        })
+    return data
+
+
+def api_comment(comment, with_replies=True):
+    """Serialize a comment, and its (already filtered) replies when with_replies is set."""
+    data = {
+        'id': comment.id,
+        'target_type': comment.target_type,
+        'game_id': comment.game_id,
+        'parent_id': comment.parent_id,
+        'author': api_author(comment),
+        'tag': comment.tag,
+        'content': comment.content,
+        'created_at': api_timestamp(comment.created_at),
+        'updated_at': api_timestamp(comment.updated_at),
+    }
+    if with_replies:
+        data['replies'] = [api_comment(reply) for reply in comment.replies]
+    return data
+
+
+def api_response(payload):
+    """
+    Compact JSON response with a body-hash ETag and a short public max-age; clients
+    sending If-None-Match get a bodiless 304 instead of the payload.
+    """
+    response = app.json.response(payload)
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['API_CACHE_MAX_AGE']
+    return response.make_conditional(request)
+
+
+def api_error(status, message):
+    """JSON error body (API clients get no HTML error pages)."""
+    response = app.json.response({'error': message})
+    response.status_code = status
+    return response
+
+
+def api_page_size(default):
+    """Page size from ?limit=, clamped to 1..API_MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', type=int) or default
+    return max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+
+def api_id_list(name):
+    """Parse a comma-separated id list (e.g. ?games=1,2,3); returns None if malformed or too long."""
+    raw = request.args.get(name, '')
+    ids = [part.strip() for part in raw.split(',') if part.strip()]
+    if len(ids) > app.config['API_MAX_BATCH_SIZE'] or not all(part.isdigit() for part in ids):
+        return None
+    return list(dict.fromkeys(int(part) for part in ids))
+
+
+def visible_comment_ids(comments):
+    """
+    Ids of the comments a public viewer may see: like filter_comments, a comment is
+    dropped when it or any ancestor is deleted or hidden. Ancestors come from the
+    thread paths, so this is one query however many comments are checked.
+    """
+    ancestor_ids = {int(segment) for comment in comments if comment.thread_path
+                    for segment in comment.thread_path.split('/')[:-2]}
+    blocked = {comment.id for comment in comments if comment.is_deleted or comment.tag == 'hidden'}
+    if ancestor_ids:
+        blocked.update(row.id for row in db.session.query(Comment.id).filter(
+            Comment.id.in_(ancestor_ids), or_(Comment.is_deleted == True, Comment.tag == 'hidden')
+        ))
+    visible = set()
+    for comment in comments:
+        path_ids = {int(segment) for segment in (comment.thread_path or '').split('/') if segment}
+        if comment.id not in blocked and not path_ids & blocked:
+            visible.add(comment.id)
+    return visible
+
+
+@app.route('/api/v1/games')
+def api_games():
+    """Keyset-paginated game list, newest first (?after=/?before= cursors, ?limit=)."""
+    games, prev_cursor, next_cursor = paginate_keyset(
+        Game.query.options(joinedload(Game.uploader)), Game, api_page_size(app.config['GAMES_PER_PAGE']),
+        after=request.args.get('after'), before=request.args.get('before'), descending=True
+    )
+    return api_response({'games': [api_game(game) for game in games],
+                         'prev_cursor': prev_cursor, 'next_cursor': next_cursor})
+
+
+@app.route('/api/v1/games/<int:game_id>')
+def api_game_detail(game_id):
+    """One game with its description and ZIP summary."""
+    game = Game.query.options(joinedload(Game.uploader)).filter_by(id=game_id).first()
+    if game is None:
+        return api_error(404, 'Game not found')
+    return api_response({'game': api_game(game, detail=True)})
+
+
+def api_comment_page(root_query):
+    """One keyset page of publicly visible top-level comments with their reply trees."""
+    query = apply_comment_filters(root_query, request.args.get('tag_filter', ''))
+    comments, prev_cursor, next_cursor = load_comment_page(query)
+    return api_response({'comments': [api_comment(comment) for comment in comments],
+                         'prev_cursor': prev_cursor, 'next_cursor': next_cursor})
+
+
+@app.route('/api/v1/games/<int:game_id>/comments')
+def api_game_comments(game_id):
+    """Comment threads of a game, paginated by top-level comment (?after=/?before=, ?tag_filter=)."""
+    if db.session.get(Game, game_id) is None:
+        return api_error(404, 'Game not found')
+    return api_comment_page(Comment.query.filter_by(game_id=game_id, parent_id=None))
+
+
+@app.route('/api/v1/requests/comments')
+def api_request_comments():
+    """Requests board threads, paginated by top-level post (?after=/?before=, ?tag_filter=)."""
+    return api_comment_page(Comment.query.filter_by(target_type='request', parent_id=None))
+
+
+@app.route('/api/v1/batch')
+def api_batch():
+    """
+    Resolve many games and comments in one request: ?games=1,2,3&comments=4,5
+    (up to API_MAX_BATCH_SIZE ids each). Ids that do not exist or are not visible
+    are listed under "missing" instead of failing the request.
+    """
+    game_ids, comment_ids = api_id_list('games'), api_id_list('comments')
+    if game_ids is None or comment_ids is None:
+        return api_error(400, f"games/comments must be comma-separated ids "
+                              f"(at most {app.config['API_MAX_BATCH_SIZE']} each)")
+
+    games = {game.id: game for game in Game.query.options(joinedload(Game.uploader))
+             .filter(Game.id.in_(game_ids))} if game_ids else {}
+    comments = {comment.id: comment for comment in Comment.query.options(joinedload(Comment.author))
+                .filter(Comment.id.in_(comment_ids))} if comment_ids else {}
+    visible = visible_comment_ids(list(comments.values()))
+
+    return api_response({
+        'games': [api_game(games[game_id], detail=True) for game_id in game_ids if game_id in games],
+        'comments': [api_comment(comments[comment_id], with_replies=False)
+                     for comment_id in comment_ids if comment_id in visible],
+        'missing': {
+            'games': [game_id for game_id in game_ids if game_id not in games],
+            'comments': [comment_id for comment_id in comment_ids if comment_id not in visible],
+        },
+    })
+
+
+# ============================================================================
+# BACKGROUND JOBS & CLI COMMANDS
+# ============================================================================
+
+@app.cli.command('sweep-hidden-comments')
+def sweep_hidden_comments_command():
+    """Restore comments that have been hidden for 7+ days."""
+    restored = sweep_hidden_comments()
+    print(f'[Sweeper] Restored {restored} hidden comments')
+
+
+@app.cli.command('backfill-report-aggregates')
+def backfill_report_aggregates_command():
+    """Recompute report_count/latest_report_at/latest_report_reason from the Report table."""
+    backfill_report_aggregates()
+    db.session.commit()
+    print('[Migration] Backfilled report aggregates on comments')
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the game and comment tables."""
+    if not search_available():
+        print(f'[Search] Skipped: full-text search needs SQLite FTS5 (got {db.engine.dialect.name})')
+        return
+    games, comments = rebuild_search_index()
+    db.session.commit()
+    print(f'[Search] Indexed {games} games and {comments} comments')
+
+
+@app.cli.command('backfill-game-manifests')
+@click.option('--batch-size', default=100, show_default=True, help='Games read and committed per batch.')
+def backfill_game_manifests_command(batch_size):
+    """Read the ZIP manifest of every game uploaded before manifests existed."""
+    total = 0
+    while True:
+        games = Game.query.filter(Game.manifest_indexed_at == None).order_by(Game.id).limit(batch_size).all()
+        if not games:
+            break
+        for game in games:
+            save_game_manifest(game)
+        db.session.commit()
+        total += len(games)
+        print(f'[Manifest] Indexed {total} games')
+    print(f'[Manifest] Done: {total} games backfilled')
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema and data migrations (safe to run from several processes at once)."""
+    applied = run_migrations()
+    print(f'[Migration] Applied {applied} migrations; database is at version {current_version()}')
+
+
+def explain_query_plan(query):
+    """Return the SQLite EXPLAIN QUERY PLAN detail lines for an ORM query."""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+    return [row[-1] for row in rows]
+
+
+def hot_queries():
+    """Representative instances of the queries behind the hot routes, for query plan checks."""
+    now = datetime.utcnow()
+    cursor = (now, 1)
+    game_roots = Comment.query.filter_by(game_id=1, parent_id=None)
+    request_roots = Comment.query.filter_by(target_type='request', parent_id=None)
+    queries = [
+        ('index: game list page', keyset_query(Game.query, Game, cursor, descending=True).limit(21)),
+        ('game_detail: comment page', keyset_query(
+            apply_comment_filters(game_roots, ''), Comment, cursor).limit(21)),
+        ('game_detail: tag-filtered comment page', keyset_query(
+            apply_comment_filters(game_roots, 'bug'), Comment, cursor).limit(21)),
+        ('requests_board: post page', keyset_query(
+            apply_comment_filters(request_roots, ''), Comment, cursor).limit(21)),
+        ('comment thread: replies under a page of roots', Comment.query.filter(or_(
+            and_(Comment.thread_path >= '0000000001/', Comment.thread_path < '0000000001/~'),
+            and_(Comment.thread_path >= '0000000002/', Comment.thread_path < '0000000002/~')
+        ))),
+        ('report_comment: duplicate check (user)', recent_report_query(1, 1, None).limit(1)),
+        ('report_comment: duplicate check (guest)', recent_report_query(1, None, '127.0.0.1').limit(1)),
+        ('sweeper: expired hidden comments', Comment.query.filter(
+            Comment.tag == 'hidden', Comment.hidden_at <= now - timedelta(days=7))),
+        ('admin badge: unresolved report count', Comment.query.with_entities(func.count(Comment.id)).filter(
+            Comment.is_report_resolved == False, Comment.report_count > 0)),
+    ]
+    for status_filter in ('unresolved', 'resolved', 'all'):
+        for sort_by in ('latest', 'count'):
+            queries.append((f'admin_reports: {status_filter} by {sort_by}',
+                            reported_comments_query(status_filter, sort_by, 'desc')))
+    return queries
+
+
+def full_table_scans(plan):
+    """The plan lines that read every row of a table: "SCAN table" without "USING ... INDEX"."""
+    return [detail for detail in plan if detail.startswith('SCAN ') and ' USING ' not in detail]
+
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Run EXPLAIN QUERY PLAN on the hot queries and fail if any falls back to a full table scan."""
+    if db.engine.dialect.name != 'sqlite':
+        print(f'[QueryPlan] Skipped: EXPLAIN QUERY PLAN checks only run on SQLite (got {db.engine.dialect.name})')
+        return
+    full_scans = []
+    for name, query in hot_queries():
+        plan = explain_query_plan(query)
+        print(f'[QueryPlan] {name}')
+        for detail in plan:
+            print(f'    {detail}')
+        full_scans.extend(f'{name}: {detail}' for detail in full_table_scans(plan))
+    if full_scans:
+        print('[QueryPlan] Full table scans found:')
+        for scan in full_scans:
+            print(f'    {scan}')
+        raise SystemExit(1)
+    print('[QueryPlan] OK: no full table scans')
+
+
+# ============================================================================
+# APPLICATION FACTORY
+# ============================================================================
+
+_setup_lock = threading.Lock()
+
+
+def create_app():
+    """
+    Finish setting up the application and return it: engine settings, request
+    metrics, upload folder, proxy headers, schema migrations, bootstrap admin and
+    the hidden comment sweeper. Importing this module only defines routes and commands;
+    everything that opens connections, writes files or starts threads happens
+    here, once per process (gunicorn calls it in each worker after forking).
+    """
+    with _setup_lock:
+        if app.extensions.get('pyforge_setup'):
+            return app
+
+        with app.app_context():
+            configure_engine(db.engine, app.config)
+            if app.config['METRICS_ENABLED']:
+                request_metrics.instrument(app, db.engine)
+
+        # Create upload folder if it doesn't exist
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+        # Serve X-Accel-Redirect downloads in-process when no nginx is in front (local development)
+        if app.config['DOWNLOAD_OFFLOAD'] == 'x-accel' and app.config['X_ACCEL_STAND_IN']:
+            app.wsgi_app = XAccelRedirectMiddleware(app.wsgi_app, app.config['X_ACCEL_REDIRECT_PREFIX'],
+                                                    app.config['UPLOAD_FOLDER'])
+
+        # Behind a reverse proxy, take the client address from the trusted X-Forwarded-For hops;
+        # otherwise every guest shares the proxy's address (and its rate-limit window)
+        if app.config['PROXY_FIX_HOPS'] > 0:
+            hops = app.config['PROXY_FIX_HOPS']
+            app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+        # Bring the database schema up to date (versioned migrations, applied once under a lock).
+        # With AUTO_MIGRATE off, run `flask --app app migrate` from the deploy step instead.
+        with app.app_context():
+            pending = pending_migrations()
+            if pending and app.config['AUTO_MIGRATE']:
+                run_migrations()
+                pending = []
+            elif pending:
+                print(f'[Migration] {len(pending)} pending migrations; run `flask --app app migrate`')
+
+            # Bootstrap admin account (needs an up-to-date user table)
+            if not pending:
+                ensure_bootstrap_admin()
+
+        # Hidden comments are auto-restored off the request path (7-day rule)
+        if app.config['HIDDEN_COMMENT_SWEEP_INTERVAL'] > 0:
+            start_hidden_comment_sweeper(app.config['HIDDEN_COMMENT_SWEEP_INTERVAL'])
+
+        app.extensions['pyforge_setup'] = True
+        return app
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,155 @@
+import mimetypes
+import mmap
+import os
+import posixpath
+import struct
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+
+# File names treated as a game's entry point, in order of preference
+ENTRY_POINT_NAMES = ('main.py', '__main__.py', 'game.py', 'run.py', 'app.py', 'start.py')
+
+
+def detect_entry_point(paths):
+    """
+    Pick the file a player should run: the shallowest well-known name (main.py,
+    game.py, ...), else the only .py file in the archive. Returns None if unsure.
+    """
+    candidates = [path for path in paths if posixpath.basename(path) in ENTRY_POINT_NAMES]
+    if candidates:
+        return min(candidates, key=lambda path: (path.count('/'),
+                                                 ENTRY_POINT_NAMES.index(posixpath.basename(path)), path))
+    python_files = [path for path in paths if path.endswith('.py')]
+    if len(python_files) == 1:
+        return python_files[0]
+    return None
+
+
+def read_manifest(path):
+    """
+    List the members of a ZIP file from its central directory, without reading
+    or extracting any member data. Returns (entries, entry_point), where each
+    entry is a dict of path, size, compressed_size and header_offset (directories
+    are skipped). Raises zipfile.BadZipFile for files that are not ZIP archives.
+    """
+    with zipfile.ZipFile(path) as archive:
+        entries = [
+            {
+                'path': info.filename,
+                'size': info.file_size,
+                'compressed_size': info.compress_size,
+                'header_offset': info.header_offset,
+            }
+            for info in archive.infolist()
+            if not info.is_dir()
+        ]
+    return entries, detect_entry_point([entry['path'] for entry in entries])
+
+
+# Local file header: signature, version, flags, method, time, date, crc, sizes, name and extra lengths
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# Member types shown inline in the browser; anything else (HTML, SVG, scripts, binaries) is
+# sent as a download so uploaded content never runs on this origin
+PREVIEW_IMAGE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp'}
+PREVIEW_TEXT_EXTENSIONS = {'.txt', '.md', '.rst', '.py', '.json', '.toml', '.cfg', '.ini', '.yaml', '.yml',
+                           '.csv', '.log'}
+
+
+def preview_type(path):
+    """Return (mimetype, inline) for serving a ZIP member to a browser."""
+    extension = posixpath.splitext(path)[1].lower()
+    if extension in PREVIEW_TEXT_EXTENSIONS or posixpath.basename(path).upper() in ('README', 'LICENSE'):
+        return 'text/plain; charset=utf-8', True
+    mimetype = mimetypes.guess_type(path)[0]
+    if mimetype in PREVIEW_IMAGE_TYPES:
+        return mimetype, True
+    return 'application/octet-stream', False
+
+
+class MappedArchive:
+    """A ZIP file mapped read-only into memory; members are read straight from their local header offset."""
+
+    def __init__(self, path, chunk_size=64 * 1024):
+        self.chunk_size = chunk_size
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            # The mapping keeps its own handle, so the file can be closed right away
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_member(self, header_offset, compressed_size, size):
+        """
+        Validate a member's local header and return an iterator over its
+        uncompressed bytes. Sizes come from the central directory (the local
+        header may defer them to a data descriptor). Raises zipfile.BadZipFile
+        for a corrupt header and NotImplementedError for encrypted members or
+        compression methods other than stored/deflate.
+        """
+        header = self.map[header_offset:header_offset + LOCAL_HEADER.size]
+        if len(header) != LOCAL_HEADER.size:
+            raise zipfile.BadZipFile('Truncated local file header')
+        signature, _, flags, method, _, _, _, _, _, name_length, extra_length = LOCAL_HEADER.unpack(header)
+        if signature != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile('Bad local file header signature')
+        if flags & 0x1:
+            raise NotImplementedError('Encrypted members are not supported')
+        start = header_offset + LOCAL_HEADER.size + name_length + extra_length
+        end = start + compressed_size
+        if end > len(self.map):
+            raise zipfile.BadZipFile('Member data runs past the end of the archive')
+        if method == zipfile.ZIP_STORED:
+            return self._iter_stored(start, end)
+        if method == zipfile.ZIP_DEFLATED:
+            return self._iter_deflated(start, end, size)
+        raise NotImplementedError(f'Compression method {method} is not supported')
+
+    def _iter_stored(self, start, end):
+        for position in range(start, end, self.chunk_size):
+            yield self.map[position:min(position + self.chunk_size, end)]
+
+    def _iter_deflated(self, start, end, size):
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        remaining = size
+        for position in range(start, end, self.chunk_size):
+            data = self.map[position:min(position + self.chunk_size, end)]
+            # Bounded output per call, and never more than the declared size (zip bombs)
+            while data and remaining > 0:
+                chunk = decompressor.decompress(data, min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                if chunk:
+                    yield chunk
+                data = decompressor.unconsumed_tail
+
+
+class ArchiveCache:
+    """
+    LRU of open MappedArchives keyed by path. An evicted archive is not closed
+    explicitly: responses still streaming from it hold a reference, and the
+    mapping is released when the last one finishes.
+    """
+
+    def __init__(self, max_open=32):
+        self.max_open = max_open
+        self._archives = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """Return the mapped archive for path, reopening it if the file on disk has changed."""
+        stat = os.stat(path)
+        identity = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            archive = self._archives.get(path)
+            if archive is not None and archive.identity == identity:
+                self._archives.move_to_end(path)
+                return archive
+        archive = MappedArchive(path)
+        with self._lock:
+            self._archives[path] = archive
+            self._archives.move_to_end(path)
+            while len(self._archives) > self.max_open:
+                self._archives.popitem(last=False)
+        return archive
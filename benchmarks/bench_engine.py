@@ -0,0 +1,188 @@
+"""
+Mixed read/write throughput of the database engine profiles (plain driver defaults vs tuned).
+
+Usage:
+    python benchmarks/bench_engine.py [--processes 4] [--threads 4] [--seconds 10] [--write-ratio 0.2]
+                                      [--profiles plain,tuned]
+
+For each profile a fresh SQLite database is seeded, then --processes worker
+processes (like gunicorn workers), each with --threads client threads, hammer it
+through the Flask test client for --seconds: a --write-ratio share of requests
+post comments on a few hot games (invalidating their cached threads), the rest
+read the game list and the hot game pages. Failed requests (e.g. "database is
+locked") are counted as errors.
+
+A fresh database per profile matters: WAL mode is stored in the database file.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAMES = 50
+COMMENTS_PER_GAME = 20
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4, help='worker processes per run')
+    parser.add_argument('--threads', type=int, default=4, help='client threads per process')
+    parser.add_argument('--seconds', type=float, default=10, help='measured duration of each run')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of requests that post a comment')
+    parser.add_argument('--profiles', default='plain,tuned', help='comma-separated DB_ENGINE_PROFILE values to compare')
+    # Internal: the parent re-runs this script as the seeding step and as each worker
+    parser.add_argument('--seed-db', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-db', help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-id', type=int, default=0, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def configure_environment(db_path, auto_migrate):
+    """Point the app at the benchmark database before it is imported."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ['DISABLE_BOOTSTRAP_ADMIN'] = '1'
+    os.environ['HIDDEN_COMMENT_SWEEP_INTERVAL'] = '0'
+    os.environ['COMMENT_RATE_LIMIT'] = '1000000000'
+    os.environ['SLOW_REQUEST_THRESHOLD_MS'] = '1000000'
+    os.environ['AUTO_MIGRATE'] = '1' if auto_migrate else '0'
+    sys.path.insert(0, ROOT)
+
+
+def seed(db_path):
+    """Create the schema and a small catalogue of games with comments."""
+    configure_environment(db_path, auto_migrate=True)
+    from datetime import datetime
+    from app import create_app, db
+    from models import User, Game, Comment
+    app = create_app()
+
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        now = datetime.utcnow()
+        db.session.execute(Game.__table__.insert(), [
+            {'id': game_id, 'title': f'Game {game_id}', 'description': 'Benchmark game',
+             'filename': f'bench-{game_id}.zip', 'uploader_id': user.id, 'created_at': now, 'updated_at': now}
+            for game_id in range(1, GAMES + 1)
+        ])
+        comment_id = 0
+        comments = []
+        for game_id in range(1, GAMES + 1):
+            for _ in range(COMMENTS_PER_GAME):
+                comment_id += 1
+                comments.append({'id': comment_id, 'content': f'Comment {comment_id}', 'target_type': 'game',
+                                 'target_id': game_id, 'game_id': game_id, 'guest_name': 'guest',
+                                 'thread_path': f'{comment_id:010d}/', 'depth': 0, 'is_deleted': False,
+                                 'is_report_resolved': False, 'report_count': 0,
+                                 'created_at': now, 'updated_at': now})
+        db.session.execute(Comment.__table__.insert(), comments)
+        db.session.commit()
+
+
+def worker(args):
+    """Run client threads until the shared deadline; print counts and latencies as JSON."""
+    # The seeding step applied the migrations; workers must not race on startup
+    configure_environment(args.worker_db, auto_migrate=False)
+    from app import create_app
+    app = create_app()
+
+    deadline = args.start_at + args.seconds
+    results = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+    lock = threading.Lock()
+
+    def client(thread_id):
+        rng = random.Random(args.worker_id * 1000 + thread_id)
+        test_client = app.test_client()
+        reads = writes = errors = 0
+        latencies = []
+        while time.time() < args.start_at:
+            time.sleep(0.001)
+        while time.time() < deadline:
+            is_write = rng.random() < args.write_ratio
+            started = time.perf_counter()
+            if is_write:
+                # Comments go to a handful of hot games, as with a popular release
+                response = test_client.post(f'/game/{rng.randint(1, 5)}/comment', data={'content': 'benchmark'})
+            elif rng.random() < 0.5:
+                response = test_client.get('/')
+            else:
+                response = test_client.get(f'/game/{rng.randint(1, 5)}')
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors += 1
+            elif is_write:
+                writes += 1
+            else:
+                reads += 1
+        with lock:
+            results['reads'] += reads
+            results['writes'] += writes
+            results['errors'] += errors
+            results['latencies'].extend(latencies)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(results))
+
+
+def run_profile(profile, args):
+    """Seed a fresh database and run every worker against it; returns aggregated results."""
+    db_path = os.path.join(tempfile.mkdtemp(prefix=f'bench-engine-{profile}-'), 'bench.db')
+    env = dict(os.environ, DB_ENGINE_PROFILE=profile)
+    script = os.path.abspath(__file__)
+    subprocess.run([sys.executable, script, '--seed-db', db_path], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    # Give every worker time to import the app before the clock starts
+    start_at = time.time() + 3 + 0.5 * args.processes
+    workers = [
+        subprocess.Popen([sys.executable, script, '--worker-db', db_path, '--start-at', str(start_at),
+                          '--worker-id', str(i), '--threads', str(args.threads), '--seconds', str(args.seconds),
+                          '--write-ratio', str(args.write_ratio)],
+                         env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for i in range(args.processes)
+    ]
+    totals = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+    for process in workers:
+        output, _ = process.communicate()
+        result = json.loads(output.strip().splitlines()[-1])
+        for key in totals:
+            totals[key] += result[key]
+    return totals
+
+
+def main():
+    args = parse_args()
+    if args.seed_db:
+        seed(args.seed_db)
+        return
+    if args.worker_db:
+        worker(args)
+        return
+
+    print(f'processes={args.processes} threads={args.threads} seconds={args.seconds} '
+          f'write_ratio={args.write_ratio} cpus={os.cpu_count()}')
+    print(f'{"profile":>8} {"req/s":>9} {"reads/s":>9} {"writes/s":>9} {"errors":>7} {"p50 ms":>8} {"p99 ms":>8}')
+    for profile in args.profiles.split(','):
+        totals = run_profile(profile, args)
+        latencies = sorted(totals['latencies']) or [0]
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        requests = totals['reads'] + totals['writes'] + totals['errors']
+        print(f'{profile:>8} {requests / args.seconds:>9.1f} {totals["reads"] / args.seconds:>9.1f} '
+              f'{totals["writes"] / args.seconds:>9.1f} {totals["errors"]:>7} '
+              f'{statistics.median(latencies) * 1000:>8.2f} {p99 * 1000:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Login throughput benchmark: logins/second against the size of the bcrypt hashing pool.
+
+Usage:
+    python benchmarks/bench_login.py [--clients 16] [--logins 64] [--rounds 10] [--workers 1,2,4,8]
+
+Runs against a throwaway SQLite database through the Flask test client, with one
+thread per simulated client (as under gunicorn's gthread worker).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client threads')
+    parser.add_argument('--logins', type=int, default=64, help='total logins per run')
+    parser.add_argument('--rounds', type=int, default=10, help='bcrypt work factor')
+    parser.add_argument('--workers', default='1,2,4,8', help='comma-separated hashing pool sizes to compare')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    data_dir = tempfile.mkdtemp(prefix='bench-login-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(data_dir, 'bench.db')
+    os.environ['DISABLE_BOOTSTRAP_ADMIN'] = '1'
+    os.environ['HIDDEN_COMMENT_SWEEP_INTERVAL'] = '0'
+    os.environ['BCRYPT_ROUNDS'] = str(args.rounds)
+    sys.path.insert(0, ROOT)
+
+    from app import create_app, db
+    from models import User, init_password_hashing
+    app = create_app()
+
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.commit()
+
+    print(f'bcrypt rounds={args.rounds} clients={args.clients} logins={args.logins} cpus={os.cpu_count()}')
+    print(f'{"pool workers":>12} {"seconds":>10} {"logins/s":>10}')
+    for workers in [int(w) for w in args.workers.split(',')]:
+        init_password_hashing(workers)
+        remaining = [args.logins]
+        lock = threading.Lock()
+
+        def client():
+            test_client = app.test_client()
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                response = test_client.post('/login', data={'username': 'bench', 'password': 'bench-password'})
+                assert response.status_code == 302, response.status_code
+                test_client.get('/logout')
+
+        threads = [threading.Thread(target=client) for _ in range(args.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f'{workers:>12} {elapsed:>10.2f} {args.logins / elapsed:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+"""
+Seeded load test for the hot routes: p50/p99 latency, SQL queries and peak memory per route.
+
+Usage:
+    python benchmarks/bench_routes.py [--users 200] [--games 300] [--roots 50] [--depth 8] [--fanout 5]
+                                      [--reports 5000] [--requests 200] [--budgets benchmarks/budgets.json]
+    python benchmarks/bench_routes.py --seed-only --db /tmp/bench.db    # then point gunicorn at it
+    python benchmarks/bench_routes.py --db /tmp/bench.db --url http://127.0.0.1:8000
+
+Seeds a throwaway SQLite database with set-based inserts: users, games, deep and
+wide comment trees on one hot game and on the requests board (with hidden and
+soft-deleted comments), flat comments on every other game, and a report storm.
+It then drives index, game_detail, requests_board, admin_reports, report_comment
+and post_comment through the Flask test client (default) or against a running
+server given with --url (latency only: queries and memory are measured in-process).
+game_detail and requests_board are mostly fragment-cache hits; their *_uncached
+variants invalidate the thread before every request so each one renders it from
+the database. With --url that only reaches the server when it shares this
+script's SHARED_CACHE_PATH.
+
+With --budgets, exits with status 1 when any route exceeds its budget
+(p99_ms, queries, peak_kb).
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help='registered users')
+    parser.add_argument('--games', type=int, default=300, help='games')
+    parser.add_argument('--comments-per-game', type=int, default=5, help='flat comments on every game but the hot one')
+    parser.add_argument('--roots', type=int, default=50, help='top-level comments on the hot game and the requests board')
+    parser.add_argument('--depth', type=int, default=8, help='length of the reply chain under each root (deep trees)')
+    parser.add_argument('--fanout', type=int, default=5, help='direct replies under each root (wide trees)')
+    parser.add_argument('--hidden', type=float, default=0.05, help='fraction of comments tagged hidden')
+    parser.add_argument('--deleted', type=float, default=0.05, help='fraction of comments soft-deleted')
+    parser.add_argument('--reports', type=int, default=5000, help='reports in the storm')
+    parser.add_argument('--reported-comments', type=int, default=500, help='comments the storm is spread over')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per route first')
+    parser.add_argument('--budgets', help='JSON file of per-route budgets: {"route": {"p99_ms": .., "queries": .., "peak_kb": ..}}')
+    parser.add_argument('--db', help='SQLite database path (default: a temporary file)')
+    parser.add_argument('--seed-only', action='store_true', help='seed the database and exit')
+    parser.add_argument('--url', help='base URL of a running server seeded from the same --db')
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point the app at the benchmark database before it is imported."""
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='bench-routes-'), 'bench.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    os.environ['DISABLE_BOOTSTRAP_ADMIN'] = '1'
+    os.environ['HIDDEN_COMMENT_SWEEP_INTERVAL'] = '0'
+    os.environ['BCRYPT_ROUNDS'] = '4'
+    # Measure the routes, not the abuse throttles
+    os.environ.setdefault('COMMENT_RATE_LIMIT', '1000000000')
+    os.environ.setdefault('REPORT_RATE_LIMIT', '1000000000')
+    sys.path.insert(0, ROOT)
+    return db_path
+
+
+def seed(args):
+    """Fill the database with bulk inserts; returns the ids the scenarios need."""
+    from app import create_app, db
+    from models import User, Game, Comment, Report
+    from migrations import backfill_report_aggregates
+    from search import search_available, rebuild_search_index
+    app = create_app()
+
+    rng = random.Random(args.seed)
+    start = datetime.utcnow() - timedelta(days=30)
+    with app.app_context():
+        if db.session.query(User.id).first() is not None:
+            print(f'[Bench] Reusing seeded database {db.engine.url.database}')
+            return scenario_ids()
+
+        # One hash for everyone: seeding should not spend minutes in bcrypt
+        admin = User(username='admin', email='admin@bench.local', is_admin=True)
+        admin.set_password('admin')
+        db.session.add(admin)
+        db.session.commit()
+        db.session.execute(User.__table__.insert(), [
+            {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@bench.local',
+             'password_hash': admin.password_hash, 'is_admin': False, 'created_at': start}
+            for user_id in range(2, args.users + 2)
+        ])
+        db.session.execute(Game.__table__.insert(), [
+            {'id': game_id, 'title': f'Game {game_id}', 'description': f'Benchmark game number {game_id}',
+             'filename': f'bench-{game_id}.zip', 'uploader_id': rng.randint(2, args.users + 1),
+             'created_at': start + timedelta(minutes=game_id), 'updated_at': start + timedelta(minutes=game_id)}
+            for game_id in range(1, args.games + 1)
+        ])
+
+        comments = []
+
+        def add_comment(target_type, game_id, parent=None):
+            comment_id = len(comments) + 1
+            created_at = start + timedelta(seconds=comment_id)
+            roll = rng.random()
+            hidden = roll < args.hidden
+            deleted = args.hidden <= roll < args.hidden + args.deleted
+            guest = rng.random() < 0.5
+            comment = {
+                'id': comment_id, 'content': f'Benchmark comment {comment_id} ' + 'lorem ipsum ' * rng.randint(1, 20),
+                'tag': 'hidden' if hidden else rng.choice([None, 'feedback', 'bug', 'request', 'discussion']),
+                'original_tag': None, 'hidden_at': created_at if hidden else None,
+                'target_type': target_type, 'target_id': game_id, 'game_id': game_id,
+                'user_id': None if guest else rng.randint(2, args.users + 1), 'guest_name': 'guest',
+                'author_ip': f'10.{comment_id % 250}.0.1' if guest else None,
+                'parent_id': parent['id'] if parent else None,
+                'created_at': created_at, 'updated_at': created_at,
+                'thread_path': (parent['thread_path'] if parent else '') + f'{comment_id:010d}/',
+                'depth': parent['depth'] + 1 if parent else 0,
+                'is_deleted': deleted, 'deleted_at': created_at if deleted else None,
+                'is_report_resolved': False, 'report_count': 0,
+            }
+            comments.append(comment)
+            return comment
+
+        # Deep and wide trees on the hot game (id 1) and the requests board
+        for target_type, game_id in (('game', 1), ('request', None)):
+            for _ in range(args.roots):
+                root = add_comment(target_type, game_id)
+                for _ in range(args.fanout):
+                    add_comment(target_type, game_id, root)
+                parent = root
+                for _ in range(args.depth):
+                    parent = add_comment(target_type, game_id, parent)
+        for game_id in range(2, args.games + 1):
+            for _ in range(args.comments_per_game):
+                add_comment('game', game_id)
+        db.session.execute(Comment.__table__.insert(), comments)
+
+        # Report storm over a subset of comments, from many guest addresses
+        reported = rng.sample(range(1, len(comments) + 1), min(args.reported_comments, len(comments)))
+        db.session.execute(Report.__table__.insert(), [
+            {'comment_id': rng.choice(reported), 'reporter_ip': f'172.16.{i // 250 % 250}.{i % 250}',
+             'reason': rng.choice([None, 'spam', 'offensive', 'off-topic']),
+             'created_at': start + timedelta(seconds=rng.randint(0, 30 * 86400))}
+            for i in range(args.reports)
+        ])
+        backfill_report_aggregates()
+        if search_available():
+            rebuild_search_index()
+        db.session.commit()
+        print(f'[Bench] Seeded {args.users + 1} users, {args.games} games, {len(comments)} comments, '
+              f'{args.reports} reports into {db.engine.url.database}')
+    return scenario_ids()
+
+
+def scenario_ids():
+    """Ids the scenarios hit: the hot game and a few live comments on it."""
+    from app import create_app
+    from models import Comment
+    app = create_app()
+    with app.app_context():
+        targets = [row.id for row in Comment.query.with_entities(Comment.id).filter(
+            Comment.game_id == 1, Comment.is_deleted == False).order_by(Comment.id).limit(50)]
+    return {'hot_game': 1, 'comments': targets}
+
+
+def scenarios(ids):
+    """(route name, needs admin login, request factory) for every benchmarked route."""
+    from app import bump_comment_version
+    counter = iter(range(1, 10 ** 9))
+
+    def unique_ip():
+        n = next(counter)
+        return f'192.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}'
+
+    def uncached(target_type, target_id, path):
+        # A new version token before every request makes the thread render miss the fragment cache
+        def make_request():
+            bump_comment_version(target_type, target_id)
+            return 'GET', path, None, None
+        return make_request
+
+    return [
+        ('index', False, lambda: ('GET', '/', None, None)),
+        ('game_detail', False, lambda: ('GET', f"/game/{ids['hot_game']}", None, None)),
+        ('game_detail_uncached', False, uncached('game', ids['hot_game'], f"/game/{ids['hot_game']}")),
+        ('requests_board', False, lambda: ('GET', '/requests', None, None)),
+        ('requests_board_uncached', False, uncached('request', None, '/requests')),
+        ('admin_reports', True, lambda: ('GET', '/admin/reports', None, None)),
+        # Each report comes from a new address, so every one passes the duplicate check and writes
+        ('report_comment', False, lambda: ('POST', f"/comment/{random.choice(ids['comments'])}/report",
+                                           {'reason': 'benchmark'}, unique_ip())),
+        ('post_comment', False, lambda: ('POST', f"/game/{ids['hot_game']}/comment",
+                                         {'content': 'benchmark comment'}, unique_ip())),
+    ]
+
+
+class TestClientDriver:
+    """Runs requests in-process and counts SQL statements per request."""
+
+    def __init__(self):
+        from sqlalchemy import event
+        from app import create_app, db
+        app = create_app()
+        self.app = app
+        self.queries = 0
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._count)
+        self.anonymous = app.test_client()
+        self.admin = app.test_client()
+        self.admin.post('/login', data={'username': 'admin', 'password': 'admin'})
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def request(self, admin, method, path, data, remote_addr):
+        client = self.admin if admin else self.anonymous
+        environ = {'REMOTE_ADDR': remote_addr} if remote_addr else {}
+        self.queries = 0
+        response = client.open(path, method=method, data=data, environ_base=environ)
+        response.get_data()
+        assert response.status_code < 400, (path, response.status_code)
+        return self.queries
+
+
+class HTTPDriver:
+    """Runs requests against a live server (gunicorn etc.); no query counts."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+        class NoRedirect(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args, **kwargs):
+                return None
+
+        self.anonymous = urllib.request.build_opener(NoRedirect)
+        self.admin = urllib.request.build_opener(NoRedirect, urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self._send(self.admin, 'POST', '/login', {'username': 'admin', 'password': 'admin'}, None)
+
+    def _send(self, opener, method, path, data, remote_addr):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if remote_addr:
+            # Only meaningful when the server trusts X-Forwarded-For (PROXY_FIX_HOPS set)
+            request.add_header('X-Forwarded-For', remote_addr)
+        try:
+            with opener.open(request) as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            if error.code >= 400:
+                raise
+
+    def request(self, admin, method, path, data, remote_addr):
+        self._send(self.admin if admin else self.anonymous, method, path, data, remote_addr)
+        return None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(driver, ids, args):
+    """Time every scenario; returns {route: {p50_ms, p99_ms, queries, peak_kb}}."""
+    results = {}
+    for name, admin, make_request in scenarios(ids):
+        for _ in range(args.warmup):
+            driver.request(admin, *make_request())
+        latencies, queries = [], []
+        for _ in range(args.requests):
+            request_args = make_request()
+            started = time.perf_counter()
+            count = driver.request(admin, *request_args)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if count is not None:
+                queries.append(count)
+        peak_kb = None
+        if isinstance(driver, TestClientDriver):
+            # Separate traced pass: tracemalloc slows requests down too much to time them
+            tracemalloc.start()
+            for _ in range(3):
+                tracemalloc.reset_peak()
+                driver.request(admin, *make_request())
+                peak_kb = max(peak_kb or 0, tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        results[name] = {
+            'p50_ms': statistics.median(latencies),
+            'p99_ms': percentile(latencies, 0.99),
+            'queries': max(queries) if queries else None,
+            'peak_kb': peak_kb,
+        }
+    return results
+
+
+def check_budgets(results, budgets):
+    """Return a list of "route: metric value > budget" strings for every exceeded budget."""
+    failures = []
+    for name, budget in budgets.items():
+        measured = results.get(name, {})
+        for metric, limit in budget.items():
+            value = measured.get(metric)
+            if value is not None and value > limit:
+                failures.append(f'{name}: {metric} {value:.1f} > {limit}')
+    return failures
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    ids = seed(args)
+    if args.seed_only:
+        return
+
+    driver = HTTPDriver(args.url) if args.url else TestClientDriver()
+    results = run(driver, ids, args)
+
+    print(f'{"route":<24} {"p50 ms":>8} {"p99 ms":>8} {"queries":>8} {"peak KB":>9}')
+    for name, measured in results.items():
+        queries = '-' if measured['queries'] is None else measured['queries']
+        peak = '-' if measured['peak_kb'] is None else f"{measured['peak_kb']:.0f}"
+        print(f"{name:<24} {measured['p50_ms']:>8.2f} {measured['p99_ms']:>8.2f} {queries:>8} {peak:>9}")
+
+    if args.budgets:
+        with open(args.budgets) as f:
+            failures = check_budgets(results, json.load(f))
+        if failures:
+            print('[Bench] Budget exceeded:')
+            for failure in failures:
+                print(f'    {failure}')
+            sys.exit(1)
+        print('[Bench] All routes within budget')
+
+
+if __name__ == '__main__':
+    main()
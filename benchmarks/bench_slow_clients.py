@@ -0,0 +1,160 @@
+"""
+Page latency under gunicorn while many slow clients are downloading a game.
+
+Usage:
+    python benchmarks/bench_slow_clients.py [--worker-classes sync,gthread,gevent] [--workers 2]
+                                            [--slow-clients 200] [--seconds 10] [--file-mb 8]
+
+For each worker class, starts gunicorn (with gunicorn.conf.py) on a throwaway
+database and upload folder, opens --slow-clients connections that each download
+a --file-mb game ZIP at a trickle, then times requests for the game list while
+those downloads are in flight. Requests that get no answer within --timeout
+seconds count as failures. sync shows the old deployment: a handful of slow
+downloads stall the whole site.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker-classes', default='sync,gthread,gevent', help='comma-separated gunicorn worker classes')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=64, help='threads per gthread worker')
+    parser.add_argument('--slow-clients', type=int, default=200, help='concurrent trickling downloads')
+    parser.add_argument('--seconds', type=float, default=10, help='how long to time page requests')
+    parser.add_argument('--timeout', type=float, default=5, help='seconds before a page request counts as failed')
+    parser.add_argument('--file-mb', type=int, default=8, help='size of the downloaded game file')
+    parser.add_argument('--port', type=int, default=8765)
+    # Internal: the parent re-runs this script to seed the database
+    parser.add_argument('--seed', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def seed(data_dir, file_mb):
+    """Create the schema and one game whose file is file_mb of incompressible bytes."""
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    from models import User, Game
+    app = create_app()
+
+    filename = 'slow-client-bench.zip'
+    with open(os.path.join(data_dir, 'uploads', filename), 'wb') as f:
+        f.write(os.urandom(file_mb * 1024 * 1024))
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Game(title='Big game', description='Large download', filename=filename,
+                            uploader_id=user.id))
+        db.session.commit()
+
+
+def trickle_download(port, stop, started):
+    """Download the game over a tiny receive buffer, a few KB per tick, until stopped."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    try:
+        sock.connect(('127.0.0.1', port))
+        sock.sendall(b'GET /game/1/download HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        started.release()
+        while not stop.is_set():
+            if not sock.recv(4096):
+                return
+            stop.wait(0.05)
+    except OSError:
+        started.release()
+    finally:
+        sock.close()
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run(worker_class, args, env):
+    """Start gunicorn, open the slow downloads, time page requests; returns (latencies, failures)."""
+    env = dict(env, GUNICORN_WORKER_CLASS=worker_class, WEB_CONCURRENCY=str(args.workers),
+               GUNICORN_THREADS=str(args.threads), PORT=str(args.port))
+    server = subprocess.Popen(['gunicorn', 'app:create_app()', '--bind', f'127.0.0.1:{args.port}'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    stop = threading.Event()
+    try:
+        if not wait_for_server(args.port):
+            raise SystemExit(f'gunicorn ({worker_class}) did not start')
+        started = threading.Semaphore(0)
+        clients = [threading.Thread(target=trickle_download, args=(args.port, stop, started), daemon=True)
+                   for _ in range(args.slow_clients)]
+        for client in clients:
+            client.start()
+        for _ in clients:
+            started.acquire()
+        # Let the servers pick up the downloads and fill the socket buffers
+        time.sleep(1)
+
+        latencies, failures = [], 0
+        deadline = time.time() + args.seconds
+        while time.time() < deadline:
+            request_started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{args.port}/', timeout=args.timeout) as response:
+                    response.read()
+                latencies.append(time.perf_counter() - request_started)
+            except OSError:
+                failures += 1
+        return latencies, failures
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    args = parse_args()
+    if args.seed:
+        seed(args.seed, args.file_mb)
+        return
+
+    data_dir = tempfile.mkdtemp(prefix='bench-slow-clients-')
+    os.makedirs(os.path.join(data_dir, 'uploads'))
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(data_dir, 'bench.db'),
+               UPLOAD_FOLDER=os.path.join(data_dir, 'uploads'),
+               SHARED_CACHE_PATH=os.path.join(data_dir, 'shared-cache.db'),
+               DISABLE_BOOTSTRAP_ADMIN='1', HIDDEN_COMMENT_SWEEP_INTERVAL='0')
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--seed', data_dir, '--file-mb', str(args.file_mb)],
+                   env=env, check=True, stdout=subprocess.DEVNULL)
+
+    print(f'workers={args.workers} threads={args.threads} slow_clients={args.slow_clients} '
+          f'file={args.file_mb}MB cpus={os.cpu_count()}')
+    print(f'{"worker class":>12} {"requests":>9} {"failed":>7} {"p50 ms":>8} {"p99 ms":>8}')
+    for worker_class in args.worker_classes.split(','):
+        latencies, failures = run(worker_class, args, env)
+        if latencies:
+            latencies.sort()
+            p50 = f'{statistics.median(latencies) * 1000:.1f}'
+            p99 = f'{latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000:.1f}'
+        else:
+            p50 = p99 = '-'
+        print(f'{worker_class:>12} {len(latencies):>9} {failures:>7} {p50:>8} {p99:>8}')
+
+
+if __name__ == '__main__':
+    main()
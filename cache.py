@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class LocalCache:
+    """In-process key/value cache with per-key TTL (not shared between workers)."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value; ttl is in seconds (None keeps it until deleted)."""
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, key):
+        """Remove a key (explicit invalidation)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class LRUCache:
+    """
+    In-process LRU cache that evicts least recently used entries to stay within a
+    memory budget (bytes). Entries can also be given a ttl in seconds.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value (marking it recently used), or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.size -= sys.getsizeof(value)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting old entries as needed; values larger than the budget are not cached."""
+        value_size = sys.getsizeof(value)
+        if value_size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            old_entry = self._data.pop(key, None)
+            if old_entry is not None:
+                self.size -= sys.getsizeof(old_entry[0])
+            self._data[key] = (value, expires_at)
+            self.size += value_size
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.size -= sys.getsizeof(evicted)
+
+    def delete(self, key):
+        """Remove a key."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self.size -= sys.getsizeof(entry[0])
+
+
+class TimedLRUCache:
+    """In-process LRU cache of at most max_entries entries, each expiring ttl seconds after it was stored."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value (marking it recently used), or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries past max_entries."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key."""
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteConnectionPool:
+    """
+    Reusable connections to one SQLite file. A connection serves one thread or
+    greenlet at a time and goes back to the pool afterwards, so gevent workers
+    (where threading.local is per greenlet, i.e. per request) do not open a new
+    connection for every request.
+    """
+
+    def __init__(self, path, max_idle=8):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection (autocommit mode, WAL) for the duration of the block."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            # Used by one borrower at a time, but not always from the thread that opened it
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+
+class SQLiteCache:
+    """
+    Key/value cache stored in a small SQLite file so every gunicorn worker on the
+    host sees the same values and invalidations. Values must be JSON-serializable.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._pool = SQLiteConnectionPool(path)
+        with self._pool.connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+            )
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        with self._pool.connection() as conn:
+            row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        # Wall-clock time because expiry is shared between processes
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """Store a value; ttl is in seconds (None keeps it until deleted)."""
+        expires_at = time.time() + ttl if ttl else None
+        with self._pool.connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires_at)
+            )
+
+    def delete(self, key):
+        """Remove a key (explicit invalidation)."""
+        with self._pool.connection() as conn:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+def create_cache(path=None):
+    """Return a SQLiteCache shared across workers when path is set, otherwise a LocalCache."""
+    if path:
+        return SQLiteCache(path)
+    return LocalCache()
@@ -4,8 +4,93 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Engine profile (see database.py): 'tuned' = SQLite WAL + pragmas / pooled server databases,
+    # 'plain' = driver defaults
+    DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'tuned')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))  # Wait for locks instead of failing
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # Bytes of the file read through mmap
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))  # Page cache per connection
+    # Server databases (PostgreSQL): connections per worker process are DB_POOL_SIZE + DB_MAX_OVERFLOW,
+    # so keep workers x that below the server's max_connections
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Seconds before a connection is replaced
+    # Apply pending migrations when the app starts (handy locally); set AUTO_MIGRATE=0 in production
+    # and run `flask --app app migrate` once per deploy so workers start without touching the schema
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', '1') == '1'
+
+    # Password hashing: bcrypt work factor and size of the bounded hashing thread pool.
+    # Stored hashes with a different cost are rehashed on the next successful login.
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
 
     # File upload settings
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file size
     ALLOWED_EXTENSIONS = {'zip'}  # Only ZIP files allowed
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read per chunk while streaming uploads to disk
+    MANIFEST_DISPLAY_LIMIT = int(os.environ.get('MANIFEST_DISPLAY_LIMIT', 200))  # ZIP members listed on game pages
+
+    # Download settings
+    # DOWNLOAD_OFFLOAD: unset = Flask streams the file, 'x-accel' = nginx X-Accel-Redirect,
+    # 'x-sendfile' = Apache/lighttpd X-Sendfile
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD') or None
+    USE_X_SENDFILE = DOWNLOAD_OFFLOAD == 'x-sendfile'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '/protected-uploads/')  # nginx internal location
+    X_ACCEL_STAND_IN = os.environ.get('X_ACCEL_STAND_IN') == '1'  # Emulate nginx locally (no proxy in front)
+    DOWNLOAD_CACHE_MAX_AGE = int(os.environ.get('DOWNLOAD_CACHE_MAX_AGE', 3600))
+    ARCHIVE_HANDLE_CACHE_SIZE = int(os.environ.get('ARCHIVE_HANDLE_CACHE_SIZE', 32))  # Memory-mapped ZIPs kept open for /game/<id>/file/...
+
+    # Seconds between background sweeps that auto-restore 7-day hidden comments (0 disables the thread;
+    # use `flask sweep-hidden-comments` from cron instead)
+    HIDDEN_COMMENT_SWEEP_INTERVAL = int(os.environ.get('HIDDEN_COMMENT_SWEEP_INTERVAL', 3600))
+
+    # Shared cache file for values that must agree across gunicorn workers (unset = in-process cache only)
+    SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH')
+    # Upper bound (seconds) on how long the admin report badge count may be served from cache
+    REPORT_COUNT_CACHE_TTL = int(os.environ.get('REPORT_COUNT_CACHE_TTL', 300))
+
+    # In-process cache of user rows for Flask-Login (skips a primary-key lookup per logged-in request).
+    # Changes invalidate entries through per-user versions in the shared cache; the TTL bounds
+    # anything that bypasses the app (e.g. manual database edits).
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))  # Entries (0 disables caching)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # Seconds
+
+    # Memory budget (bytes) for the in-process LRU cache of rendered comment threads (0 disables caching).
+    # Invalidation goes through per-target versions in the shared cache, so with several worker
+    # processes set SHARED_CACHE_PATH as well.
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    # Upper bound (seconds) on how long a rendered thread may be served; the only bound when a
+    # change was made in another worker process and SHARED_CACHE_PATH is unset
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 30))
+
+    # Abuse throttling: sliding windows checked before any database work, per logged-in user or
+    # per IP for guests (with several worker processes set SHARED_CACHE_PATH so they share windows)
+    # Reverse proxies in front of the app (Render's router counts as one). Guests are identified by
+    # IP, so this many X-Forwarded-For/-Proto hops are trusted; 0 uses the socket address as-is.
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+    COMMENT_RATE_LIMIT = int(os.environ.get('COMMENT_RATE_LIMIT', 5))  # Comments per window
+    COMMENT_RATE_WINDOW = int(os.environ.get('COMMENT_RATE_WINDOW', 60))  # Seconds
+    REPORT_RATE_LIMIT = int(os.environ.get('REPORT_RATE_LIMIT', 10))  # Reports per window
+    REPORT_RATE_WINDOW = int(os.environ.get('REPORT_RATE_WINDOW', 600))  # Seconds
+
+    # Rows fetched per batch while streaming admin exports (memory use is bounded by one batch)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+    # Read-only JSON API (/api/v1/...)
+    API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 30))  # Seconds clients/proxies may reuse a response
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+    API_MAX_BATCH_SIZE = int(os.environ.get('API_MAX_BATCH_SIZE', 100))  # Ids per type in /api/v1/batch
+
+    # Request instrumentation (query counts, SQL/render time, latency per endpoint) at /admin/metrics.
+    # Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged with their first SLOW_REQUEST_MAX_STATEMENTS statements.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500))
+    SLOW_REQUEST_MAX_STATEMENTS = int(os.environ.get('SLOW_REQUEST_MAX_STATEMENTS', 50))
+
+    # Pagination settings (keyset pagination page sizes)
+    GAMES_PER_PAGE = int(os.environ.get('GAMES_PER_PAGE', 20))
+    COMMENTS_PER_PAGE = int(os.environ.get('COMMENTS_PER_PAGE', 20))
+    SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 20))
@@ -0,0 +1,63 @@
+"""
+Database engine profile, chosen from the database URL.
+
+SQLite connections get WAL journaling (readers no longer wait for a writer),
+synchronous=NORMAL, a busy timeout, memory-mapped I/O and a larger page cache.
+Server databases (PostgreSQL, MySQL) get a sized connection pool with pre-ping,
+so connections dropped by the server or a proxy are replaced transparently.
+DB_ENGINE_PROFILE=plain turns all of this off (driver defaults, for comparison).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def tuned(config):
+    return config['DB_ENGINE_PROFILE'] != 'plain'
+
+
+def engine_options(config):
+    """SQLAlchemy create_engine() options for the configured database URL."""
+    if not tuned(config):
+        return {}
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # sqlite3's own lock wait, on top of PRAGMA busy_timeout for statements it runs itself
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection."""
+    return [
+        # WAL is persistent in the database file; setting it again is a no-op
+        'PRAGMA journal_mode=WAL',
+        # With WAL, NORMAL only syncs at checkpoints: a power loss can drop the last commits, never corrupt
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size={-int(config['SQLITE_CACHE_SIZE_KB'])}",
+    ]
+
+
+def configure_engine(engine, config):
+    """Install per-connection settings on an engine created with engine_options()."""
+    if not tuned(config) or engine.dialect.name != 'sqlite':
+        return
+    if engine.url.database in (None, '', ':memory:'):
+        # In-memory databases have no journal to switch and live on one connection
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
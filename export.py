@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+
+def serialize_value(value):
+    """Plain value for CSV/JSON output (datetimes as ISO 8601)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# Leading characters that make spreadsheet apps evaluate a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    """
+    CSV value for a column: like serialize_value, but user text that a spreadsheet
+    would run as a formula is prefixed with ' so it stays plain text.
+    """
+    value = serialize_value(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_rows(session, model, since=None, batch_size=1000):
+    """
+    Stream every row of model's table as column tuples, oldest first, fetched in
+    batches of batch_size (server-side cursors where the driver supports them),
+    so memory stays flat whatever the table size. Returns (column names, batches).
+    """
+    table = model.__table__
+    statement = select(table).order_by(table.c.id)
+    if since is not None:
+        timestamp = table.c.changed_at if 'changed_at' in table.c else table.c.created_at
+        statement = statement.where(timestamp >= since)
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    return list(result.keys()), result.partitions()
+
+
+def iter_csv(columns, batches):
+    """Yield CSV text (header first), one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows([csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header of an empty export
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(columns, batches):
+    """Yield newline-delimited JSON objects, one chunk per batch."""
+    for batch in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(serialize_value, row))), ensure_ascii=False, separators=(',', ':')) + '\n'
+            for row in batch
+        )
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings, read automatically from the working directory:
+
+    gunicorn 'app:create_app()'
+
+Workers are threaded (gthread) on SQLite, so one slow upload or download ties
+up a thread rather than a whole process. With a server database (DATABASE_URL
+not sqlite) the default is gevent, which serves many more slow clients per
+process; on SQLite it is not, because lock waits block gevent's event loop.
+GUNICORN_WORKER_CLASS overrides the choice either way.
+"""
+import multiprocessing
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+server_database = not os.environ.get('DATABASE_URL', 'sqlite').startswith('sqlite')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS') or ('gevent' if server_database else 'gthread')
+# A few processes; concurrency comes from threads/greenlets inside each one
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count() + 1)))
+threads = int(os.environ.get('GUNICORN_THREADS', 64))  # gthread: requests in flight per worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))  # gevent: clients per worker
+
+# Several workers must share rate-limit windows and cache versions, or each one keeps serving
+# pages another worker has invalidated. Default the shared cache to a file on tmpfs; the workers
+# import the app after forking, so they inherit it from this environment.
+if workers > 1 and not os.environ.get('SHARED_CACHE_PATH'):
+    shared_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    os.environ['SHARED_CACHE_PATH'] = os.path.join(shared_dir, f"pyforge-shared-cache-{bind.rsplit(':', 1)[-1]}.db")
+
+# The app is created in each worker after forking (create_app opens connections and starts the
+# hidden-comment sweeper thread, neither of which survives a fork)
+preload_app = False
+
+# Heartbeat timeout for a stuck worker; with gthread/gevent a long transfer does not count against it
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot build up (jitter avoids restarting all at once).
+# Each worker's hidden-comment sweeper runs once shortly after boot, so recycling does not starve it.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+# Heartbeat files on tmpfs: a slow or full disk must not make healthy workers look stuck
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None  # '-' logs requests to stdout
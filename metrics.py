@@ -0,0 +1,207 @@
+"""
+Per-request instrumentation: SQL query count and time (SQLAlchemy engine events),
+template render time (Flask signals), latency and response size, aggregated per
+endpoint and exposed in the Prometheus text format.
+
+Everything is kept in process memory, so each gunicorn worker reports its own
+counters. The per-query cost is two perf_counter() calls and a list append.
+"""
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Upper bounds of the latency histogram buckets (seconds) and of the queries-per-request histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# Label for requests that matched no route (keeps 404 scans from creating new series)
+UNMATCHED_ENDPOINT = 'unmatched'
+
+
+class RequestStats:
+    """What one request has done so far; lives on flask.g."""
+
+    __slots__ = ('started', 'queries', 'sql_time', 'render_time', 'render_depth', 'render_started', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_depth = 0
+        self.render_started = 0.0
+        # (seconds, SQL text) of the first statements, printed if the request turns out slow
+        self.statements = []
+
+
+class EndpointStats:
+    """Running totals for one endpoint."""
+
+    __slots__ = ('statuses', 'duration_buckets', 'duration_sum', 'query_buckets', 'queries',
+                 'sql_time', 'render_time', 'response_bytes', 'slow')
+
+    def __init__(self):
+        self.statuses = {}
+        # One slot per bucket plus +Inf; made cumulative when rendered
+        self.duration_buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.duration_sum = 0.0
+        self.query_buckets = [0] * (len(QUERY_COUNT_BUCKETS) + 1)
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.response_bytes = 0
+        self.slow = 0
+
+
+class RequestMetrics:
+    """
+    Collects per-endpoint request metrics for a Flask app and its SQLAlchemy
+    engine. Requests slower than slow_threshold seconds are printed to the
+    log with their SQL statements (text only; parameters are never logged).
+    """
+
+    def __init__(self, slow_threshold=0.5, max_statements=50):
+        self.slow_threshold = slow_threshold
+        self.max_statements = max_statements
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def instrument(self, app, engine):
+        """Install the Flask hooks and engine listeners."""
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._after_render, app, weak=False)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # -- hooks ---------------------------------------------------------------
+
+    def _start_request(self):
+        g.request_stats = RequestStats()
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = g.get('request_stats')
+        if stats is not None:
+            if stats.render_depth == 0:
+                stats.render_started = time.perf_counter()
+            stats.render_depth += 1
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = g.get('request_stats')
+        if stats is not None and stats.render_depth:
+            stats.render_depth -= 1
+            if stats.render_depth == 0:
+                stats.render_time += time.perf_counter() - stats.render_started
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Background threads (hidden-comment sweeper, CLI commands) run outside requests.
+        # The start time lives on the statement's execution context, so a statement that
+        # raises (and never reaches after_cursor_execute) leaves nothing behind.
+        if context is not None and has_request_context():
+            context.metrics_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'metrics_query_started', None)
+        if started is None or not has_request_context():
+            return
+        elapsed = time.perf_counter() - started
+        stats = g.get('request_stats')
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.sql_time += elapsed
+        if len(stats.statements) < self.max_statements:
+            stats.statements.append((elapsed, statement))
+
+    def _finish_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        duration = time.perf_counter() - stats.started
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        # Unknown for streamed responses (exports, file members); counted as 0
+        size = response.content_length or 0
+        slow = duration >= self.slow_threshold
+        with self._lock:
+            totals = self._endpoints.get(endpoint)
+            if totals is None:
+                totals = self._endpoints[endpoint] = EndpointStats()
+            totals.statuses[response.status_code] = totals.statuses.get(response.status_code, 0) + 1
+            totals.duration_buckets[bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+            totals.duration_sum += duration
+            totals.query_buckets[bisect.bisect_left(QUERY_COUNT_BUCKETS, stats.queries)] += 1
+            totals.queries += stats.queries
+            totals.sql_time += stats.sql_time
+            totals.render_time += stats.render_time
+            totals.response_bytes += size
+            totals.slow += slow
+        if slow:
+            self._log_slow_request(endpoint, response, duration, stats)
+        return response
+
+    def _log_slow_request(self, endpoint, response, duration, stats):
+        print(f'[SlowRequest] {request.method} {request.path} ({endpoint}) -> {response.status_code} '
+              f'in {duration * 1000:.0f} ms: {stats.queries} queries, {stats.sql_time * 1000:.0f} ms SQL, '
+              f'{stats.render_time * 1000:.0f} ms render')
+        for elapsed, statement in stats.statements:
+            print(f'[SlowRequest]   {elapsed * 1000:7.1f} ms  {" ".join(statement.split())}')
+        if stats.queries > len(stats.statements):
+            print(f'[SlowRequest]   ... {stats.queries - len(stats.statements)} more statements')
+
+    # -- exposition ----------------------------------------------------------
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            snapshot = {endpoint: (dict(totals.statuses), list(totals.duration_buckets), totals.duration_sum,
+                                   list(totals.query_buckets), totals.queries, totals.sql_time,
+                                   totals.render_time, totals.response_bytes, totals.slow)
+                        for endpoint, totals in self._endpoints.items()}
+        endpoints = sorted(snapshot)
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, bounds, index):
+            for endpoint in endpoints:
+                label = _label(endpoint)
+                values = snapshot[endpoint]
+                running = 0
+                for bound, count in zip(bounds + ('+Inf',), values[index]):
+                    running += count
+                    lines.append(f'{name}_bucket{{endpoint="{label}",le="{bound}"}} {running}')
+                lines.append(f'{name}_count{{endpoint="{label}"}} {running}')
+                lines.append(f'{name}_sum{{endpoint="{label}"}} {values[index + 1]}')
+
+        metric('pyforge_http_requests_total', 'counter', 'Requests handled, by endpoint and status code.')
+        for endpoint in endpoints:
+            for status, count in sorted(snapshot[endpoint][0].items()):
+                lines.append(f'pyforge_http_requests_total{{endpoint="{_label(endpoint)}",status="{status}"}} {count}')
+
+        metric('pyforge_http_request_duration_seconds', 'histogram', 'Time from the first request hook to the response.')
+        histogram('pyforge_http_request_duration_seconds', DURATION_BUCKETS, 1)
+
+        metric('pyforge_sql_queries_per_request', 'histogram', 'SQL statements executed per request.')
+        histogram('pyforge_sql_queries_per_request', QUERY_COUNT_BUCKETS, 3)
+
+        for name, index, help_text in (
+            ('pyforge_sql_duration_seconds_total', 5, 'Time spent executing SQL statements.'),
+            ('pyforge_template_render_seconds_total', 6, 'Time spent rendering templates (includes lazy-load SQL).'),
+            ('pyforge_response_bytes_total', 7, 'Response body bytes (streamed responses are not counted).'),
+            ('pyforge_slow_requests_total', 8, 'Requests over the slow-request threshold.'),
+        ):
+            metric(name, 'counter', help_text)
+            for endpoint in endpoints:
+                lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {snapshot[endpoint][index]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,259 @@
+"""
+Versioned, set-based migrations.
+
+Every migration is a numbered function that updates rows with a handful of
+UPDATE statements (never one ORM object at a time). Applied versions are
+recorded in the schema_migration table, so a migration runs once per database,
+and runners serialize on a lock row, so several workers or deploy hooks
+starting together do not race. When nothing is pending, checking costs a
+single query.
+
+Model changes (new tables, columns, indexes) are applied by sync_schema()
+before pending migrations run, so a model change ships with a migration entry
+for its backfill (or a no-op one) to get picked up.
+"""
+import os
+import socket
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import cast, delete, func, inspect as sa_inspect, select, text, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import aliased
+
+from models import db, User, Game, Comment, Report, SchemaMigration, SchemaMigrationLock
+from search import search_available, rebuild_search_index
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a migration function under a version number (applied in ascending order)."""
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return func
+    return register
+
+
+def add_missing_columns():
+    """
+    Add model columns and indexes that are missing from existing tables.
+    db.create_all() only creates new tables, so columns added to a model later
+    are created here (as nullable) and then backfilled by a migration.
+    """
+    inspector = sa_inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f'[Migration] Added column {table.name}.{column.name}')
+        db.session.commit()
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+def sync_schema():
+    """Create missing tables, columns and indexes from the models."""
+    db.create_all()
+    add_missing_columns()
+
+
+def backfill_report_aggregates():
+    """Recompute the denormalized report aggregates on every comment with one UPDATE (caller commits)."""
+    reports = select(Report).where(Report.comment_id == Comment.id)
+    return backfill(
+        Comment,
+        report_count=reports.with_only_columns(func.count(Report.id)).scalar_subquery(),
+        latest_report_at=reports.with_only_columns(func.max(Report.created_at)).scalar_subquery(),
+        latest_report_reason=reports.with_only_columns(Report.reason).order_by(
+            Report.created_at.desc(), Report.id.desc()
+        ).limit(1).scalar_subquery()
+    )
+
+
+def backfill(model, *criteria, **values):
+    """One set-based UPDATE; backfills are not edits, so updated_at is left untouched."""
+    if 'updated_at' in model.__table__.c:
+        values.setdefault('updated_at', model.updated_at)
+    return db.session.execute(
+        update(model).where(*criteria).values(**values).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def thread_segment(id_column):
+    """SQL for Comment.set_thread_path's zero-padded path segment ("%010d/")."""
+    if db.engine.dialect.name == 'sqlite':
+        return func.printf('%010d/', id_column)
+    return func.lpad(cast(id_column, db.String), 10, '0').concat('/')
+
+
+# ----------------------------------------------------------------------------
+# Migrations (append new ones at the end; never renumber applied versions)
+# ----------------------------------------------------------------------------
+
+@migration(1, 'Set target_type/target_id on legacy game comments')
+def migrate_comment_targets():
+    return backfill(Comment, Comment.target_type == None, target_type='game', target_id=Comment.game_id)
+
+
+@migration(2, 'Initialize comment.is_deleted')
+def migrate_comment_is_deleted():
+    return backfill(Comment, Comment.is_deleted == None, is_deleted=False)
+
+
+@migration(3, 'Initialize user.is_admin')
+def migrate_user_is_admin():
+    return backfill(User, User.is_admin == None, is_admin=False)
+
+
+@migration(4, 'Initialize comment.is_report_resolved')
+def migrate_comment_is_report_resolved():
+    return backfill(Comment, Comment.is_report_resolved == None, is_report_resolved=False)
+
+
+@migration(5, 'Backfill comment thread paths')
+def migrate_comment_thread_paths():
+    # Top-level comments first, then one UPDATE per reply level whose parents already have a path
+    updated = backfill(Comment, Comment.thread_path == None, Comment.parent_id == None,
+                       thread_path=thread_segment(Comment.id), depth=0)
+    parent = aliased(Comment)
+    parent_row = select(parent).where(parent.id == Comment.parent_id)
+    while True:
+        level = backfill(
+            Comment,
+            Comment.thread_path == None,
+            Comment.parent_id.in_(select(parent.id).where(parent.thread_path != None)),
+            thread_path=parent_row.with_only_columns(parent.thread_path).scalar_subquery().concat(
+                thread_segment(Comment.id)),
+            depth=parent_row.with_only_columns(parent.depth).scalar_subquery() + 1,
+        )
+        if not level:
+            return updated
+        updated += level
+
+
+@migration(6, 'Backfill comment report aggregates')
+def migrate_report_aggregates():
+    if not db.session.query(Comment.query.filter(Comment.report_count == None).exists()).scalar():
+        return 0
+    return backfill_report_aggregates()
+
+
+@migration(7, 'Initialize game/comment updated_at')
+def migrate_updated_at():
+    return sum(backfill(model, model.updated_at == None, updated_at=model.created_at)
+               for model in (Game, Comment))
+
+
+@migration(8, 'Create and populate the full-text search index')
+def migrate_search_index():
+    if not search_available():
+        return 0
+    return sum(rebuild_search_index())
+
+
+@migration(9, 'Add ZIP manifests (existing games: flask backfill-game-manifests)')
+def migrate_game_manifests():
+    # Reading every stored ZIP is too slow for a deploy step; the batch command backfills them
+    return 0
+
+
+@migration(10, 'Add comment.author_ip for bulk moderation')
+def migrate_comment_author_ip():
+    # Addresses were never recorded for existing comments; nothing to backfill
+    return 0
+
+
+@migration(11, 'Initialize user.session_version')
+def migrate_user_session_version():
+    return backfill(User, User.session_version == None, session_version=0)
+
+
+# ----------------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------------
+
+def pending_migrations():
+    """Migrations not yet applied to this database, in order."""
+    if not sa_inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return list(MIGRATIONS)
+    applied = set(db.session.scalars(select(SchemaMigration.version)))
+    return [entry for entry in MIGRATIONS if entry[0] not in applied]
+
+
+def current_version():
+    """Highest applied migration version (0 for a database that has never been migrated)."""
+    if not sa_inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return 0
+    return db.session.scalar(select(func.max(SchemaMigration.version))) or 0
+
+
+def create_bookkeeping_tables():
+    """Create the schema_migration and lock tables; tolerate another process creating them first."""
+    for model in (SchemaMigration, SchemaMigrationLock):
+        try:
+            model.__table__.create(bind=db.engine, checkfirst=True)
+        except DBAPIError:
+            if not sa_inspect(db.engine).has_table(model.__tablename__):
+                raise
+
+
+@contextmanager
+def migration_lock(poll_interval=0.5, stale_after=timedelta(minutes=30)):
+    """
+    Hold the single migration lock row for the duration of the block.
+    Other runners poll until it is released; a lock older than stale_after is
+    assumed to belong to a runner that died and is taken over.
+    """
+    owner = f'{socket.gethostname()}:{os.getpid()}'
+    waiting_since = None
+    while True:
+        db.session.add(SchemaMigrationLock(id=1, owner=owner))
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+        stale = db.session.execute(delete(SchemaMigrationLock).where(
+            SchemaMigrationLock.locked_at < datetime.utcnow() - stale_after
+        )).rowcount
+        db.session.commit()
+        if stale:
+            print('[Migration] Took over a stale migration lock')
+            continue
+        if waiting_since is None:
+            waiting_since = time.monotonic()
+            print('[Migration] Waiting for another process to finish migrating...')
+        time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(SchemaMigrationLock).where(SchemaMigrationLock.owner == owner))
+        db.session.commit()
+
+
+def run_migrations():
+    """Apply pending migrations under the lock; returns how many were applied by this process."""
+    if not pending_migrations():
+        return 0
+    create_bookkeeping_tables()
+    with migration_lock():
+        # Another process may have applied them while we waited for the lock
+        pending = pending_migrations()
+        if not pending:
+            return 0
+        sync_schema()
+        for version, name, migrate in pending:
+            started = time.monotonic()
+            rows = migrate()
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+            print(f'[Migration] {version:03d} {name}: {rows} rows ({time.monotonic() - started:.2f}s)')
+    return len(pending)
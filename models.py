@@ -1,10 +1,49 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import bcrypt
 
 db = SQLAlchemy()
 
+# Bounded pool for bcrypt work; bcrypt releases the GIL, so hashing runs in parallel
+# with request threads while capping how many hashes can burn CPU at once
+password_hash_pool = None
+
+
+def password_hash_executor_class():
+    """
+    ThreadPoolExecutor, or gevent's native-thread version when threading is
+    monkey-patched (gunicorn gevent workers): patched "threads" are greenlets,
+    and bcrypt would run on the event loop and stall every other client.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ThreadPoolExecutor
+    if monkey.is_module_patched('threading'):
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor
+    return ThreadPoolExecutor
+
+
+def init_password_hashing(workers):
+    """(Re)create the bounded bcrypt thread pool with the given number of workers."""
+    global password_hash_pool
+    old_pool = password_hash_pool
+    password_hash_pool = password_hash_executor_class()(max_workers=workers, thread_name_prefix='bcrypt')
+    if old_pool is not None:
+        old_pool.shutdown(wait=False)
+
+
+def run_password_hashing(func, *args):
+    """Run a bcrypt call on the bounded pool and wait for its result."""
+    if password_hash_pool is None:
+        return func(*args)
+    return password_hash_pool.submit(func, *args).result()
+
+
 class User(UserMixin, db.Model):
     """User model for authentication and game ownership."""
     id = db.Column(db.Integer, primary_key=True)
@@ -13,18 +52,29 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
+    # Copied into the session at login; bumping it (password change) signs out every other session
+    session_version = db.Column(db.Integer, default=0, nullable=False)
 
     # Relationship to games
     games = db.relationship('Game', backref='uploader', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        """Hash and set the user's password."""
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        """Hash and set the user's password with the configured bcrypt work factor."""
+        salt = bcrypt.gensalt(rounds=current_app.config['BCRYPT_ROUNDS'])
+        self.password_hash = run_password_hashing(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
 
     def check_password(self, password):
         """Verify password against stored hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return run_password_hashing(bcrypt.checkpw, password.encode('utf-8'), self.password_hash.encode('utf-8'))
+
+    def password_needs_rehash(self):
+        """Check whether the stored hash was made with a different work factor than configured."""
+        try:
+            # bcrypt hashes look like "$2b$<cost>$<salt+hash>"
+            cost = int(self.password_hash.split('$')[2])
+        except (IndexError, ValueError):
+            return True
+        return cost != current_app.config['BCRYPT_ROUNDS']
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -32,12 +82,25 @@ class User(UserMixin, db.Model):
 
 class Game(db.Model):
     """Game model for uploaded game files and metadata."""
+    __table_args__ = (
+        # Game list pages in (created_at, id) order
+        db.Index('ix_game_created_at', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    filename = db.Column(db.String(255), nullable=False)  # Stored file name
+    filename = db.Column(db.String(255), nullable=False)  # Stored file path, relative to UPLOAD_FOLDER
+    file_sha256 = db.Column(db.String(64), db.ForeignKey('stored_file.sha256'), nullable=True, index=True)  # Null for legacy uploads
     uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    # ZIP manifest summary (rows in GameFile); manifest_indexed_at is null until the ZIP has been read
+    manifest_indexed_at = db.Column(db.DateTime, nullable=True, index=True)
+    file_count = db.Column(db.Integer, nullable=True)  # Null if the upload is not a readable ZIP
+    uncompressed_size = db.Column(db.BigInteger, nullable=True)
+    entry_point = db.Column(db.String(500), nullable=True)  # e.g. "mygame/main.py"
 
     # Relationship to comments
     comments = db.relationship('Comment', backref='game', lazy=True, cascade='all, delete-orphan')
@@ -46,8 +109,56 @@ class Game(db.Model):
         return f'<Game {self.title}>'
 
 
+class GameFile(db.Model):
+    """One member of a game's ZIP, read from the archive's central directory at upload time."""
+    __table_args__ = (
+        # Manifest listing on game_detail and member lookups, in path order
+        db.Index('ix_game_file_game_path', 'game_id', 'path'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False)
+    path = db.Column(db.String(500), nullable=False)  # Member name inside the ZIP
+    size = db.Column(db.BigInteger, nullable=False)  # Uncompressed bytes
+    compressed_size = db.Column(db.BigInteger, nullable=False)
+    header_offset = db.Column(db.BigInteger, nullable=False)  # Offset of the member's local file header
+
+    def __repr__(self):
+        return f'<GameFile {self.game_id}:{self.path}>'
+
+
+class StoredFile(db.Model):
+    """Content-addressed upload stored once on disk and shared by every game with identical content."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False)  # Relative to UPLOAD_FOLDER
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)  # Number of games using this file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.sha256[:12]} refs={self.ref_count}>'
+
+
 class Comment(db.Model):
     """Comment model for game comments, requests board, and replies."""
+    __table_args__ = (
+        # Game comment pages: top-level comments of a game in (created_at, id) order
+        db.Index('ix_comment_game_thread', 'game_id', 'parent_id', 'created_at', 'id'),
+        # Requests board pages: top-level posts in (created_at, id) order
+        db.Index('ix_comment_target_thread', 'target_type', 'parent_id', 'created_at', 'id'),
+        # Conditional GET validator: latest comment change per game
+        db.Index('ix_comment_game_updated', 'game_id', 'updated_at'),
+        # Hidden comment sweeper: expired hidden comments
+        db.Index('ix_comment_tag_hidden_at', 'tag', 'hidden_at'),
+        # Admin reports dashboard: filter by resolution status, sort by latest report or count
+        db.Index('ix_comment_reports_latest', 'is_report_resolved', 'latest_report_at'),
+        db.Index('ix_comment_reports_count', 'is_report_resolved', 'report_count'),
+        db.Index('ix_comment_report_count', 'report_count'),
+        # Bulk moderation by author (guest IP or account)
+        db.Index('ix_comment_author_ip', 'author_ip'),
+        db.Index('ix_comment_user_id', 'user_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     tag = db.Column(db.String(20), nullable=True)  # Tag: feedback, bug, request, discussion, hidden, or None
@@ -63,8 +174,14 @@ class Comment(db.Model):
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Null for guests
     guest_name = db.Column(db.String(50), default='guest')
+    author_ip = db.Column(db.String(45), nullable=True)  # Guests only (admin moderation); null for logged-in users
     parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)  # Self-referential for replies
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Materialized thread path: zero-padded ancestor ids ending with this comment's id, e.g. "0000000012/0000000034/"
+    thread_path = db.Column(db.Text, nullable=True, index=True)
+    depth = db.Column(db.Integer, nullable=True)  # 0 for top-level comments
 
     # Soft delete fields
     is_deleted = db.Column(db.Boolean, default=False, nullable=False)
@@ -77,12 +194,45 @@ class Comment(db.Model):
     report_resolved_at = db.Column(db.DateTime, nullable=True)
     report_resolved_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
+    # Denormalized report aggregates, maintained by report_comment
+    report_count = db.Column(db.Integer, default=0, nullable=False)
+    latest_report_at = db.Column(db.DateTime, nullable=True)
+    latest_report_reason = db.Column(db.String(200), nullable=True)
+
     # Relationships
     author = db.relationship('User', foreign_keys=[user_id], backref='comments', lazy=True)
     deleted_by = db.relationship('User', foreign_keys=[deleted_by_user_id], lazy=True)
     report_resolved_by = db.relationship('User', foreign_keys=[report_resolved_by_user_id], lazy=True)
     replies = db.relationship('Comment', backref=db.backref('parent', remote_side=[id]), lazy=True, cascade='all, delete-orphan')
 
+    def set_thread_path(self, parent=None):
+        """Fill thread_path and depth from the parent comment (the comment must be flushed so it has an id)."""
+        segment = f'{self.id:010d}/'
+        if parent is None:
+            self.thread_path = segment
+            self.depth = 0
+        else:
+            self.thread_path = parent.thread_path + segment
+            self.depth = parent.depth + 1
+
+    def descendants_query(self, max_depth=None):
+        """
+        Query all replies under this comment as one indexed range scan on thread_path.
+        max_depth limits how many levels below this comment are included.
+        """
+        # Paths only contain digits and '/', which all sort below '~'
+        query = Comment.query.filter(
+            Comment.thread_path > self.thread_path,
+            Comment.thread_path < self.thread_path + '~'
+        )
+        if max_depth is not None:
+            query = query.filter(Comment.depth <= self.depth + max_depth)
+        return query
+
+    def descendant_count(self):
+        """Count all replies under this comment without walking the tree."""
+        return self.descendants_query().count()
+
     def __repr__(self):
         if self.target_type == 'game':
             return f'<Comment {self.id} on Game {self.target_id}>'
@@ -109,6 +259,12 @@ class CommentTagHistory(db.Model):
 
 class Report(db.Model):
     """Report model for comment reports - anyone can report including guests."""
+    __table_args__ = (
+        # 24-hour duplicate report check, for logged-in users and for guests
+        db.Index('ix_report_comment_user', 'comment_id', 'reporter_user_id', 'created_at'),
+        db.Index('ix_report_comment_ip', 'comment_id', 'reporter_ip', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     comment_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -122,3 +278,20 @@ class Report(db.Model):
 
     def __repr__(self):
         return f'<Report {self.id} on Comment {self.comment_id}>'
+
+
+class SchemaMigration(db.Model):
+    """Data migrations that have been applied to this database (see migrations.py)."""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<SchemaMigration {self.version}: {self.name}>'
+
+
+class SchemaMigrationLock(db.Model):
+    """Single-row lock held while migrations run, so concurrent runners wait instead of racing."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    owner = db.Column(db.String(100), nullable=False)  # host:pid of the process holding the lock
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from cache import SQLiteConnectionPool
+
+
+class LocalRateLimiter:
+    """
+    In-process sliding-window limiter (not shared between workers). Each key keeps
+    a ring buffer of its last `limit` hit times, so a check is O(1) and memory per
+    key is bounded; the least recently used keys are dropped past max_keys.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """Record a hit and return True, or return False (recording nothing) if key already has limit hits in the last window seconds."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._windows.get(key)
+            if hits is None or hits.maxlen != limit:
+                hits = deque(hits or (), maxlen=limit)
+                self._windows[key] = hits
+            self._windows.move_to_end(key)
+            # The buffer holds the last `limit` hits; if the oldest is still inside the window, the key is over
+            if len(hits) == limit and hits[0] > now - window:
+                return False
+            hits.append(now)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            return True
+
+
+class SQLiteRateLimiter:
+    """
+    Sliding-window limiter stored in a small SQLite file so every gunicorn worker
+    on the host counts against the same windows.
+    """
+
+    # Expired hits of all keys are purged about once every this many hits
+    purge_every = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._hits_since_purge = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._pool = SQLiteConnectionPool(path)
+        with self._pool.connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_hit '
+                '(key TEXT NOT NULL, hit_at REAL NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_hit_key ON rate_limit_hit (key, hit_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_hit_expires ON rate_limit_hit (expires_at)')
+
+    def hit(self, key, limit, window):
+        """Record a hit and return True, or return False (recording nothing) if key already has limit hits in the last window seconds."""
+        # Wall-clock time because windows are shared between processes
+        now = time.time()
+        with self._pool.connection() as conn:
+            # BEGIN IMMEDIATE takes the write lock up front so count-then-insert is atomic across workers
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM rate_limit_hit WHERE key = ? AND hit_at <= ?', (key, now - window))
+                (count,) = conn.execute('SELECT COUNT(*) FROM rate_limit_hit WHERE key = ?', (key,)).fetchone()
+                allowed = count < limit
+                if allowed:
+                    conn.execute('INSERT INTO rate_limit_hit (key, hit_at, expires_at) VALUES (?, ?, ?)',
+                                 (key, now, now + window))
+                self._hits_since_purge += 1
+                if self._hits_since_purge >= self.purge_every:
+                    self._hits_since_purge = 0
+                    conn.execute('DELETE FROM rate_limit_hit WHERE expires_at <= ?', (now,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return allowed
+
+
+def create_rate_limiter(path=None):
+    """Return a SQLiteRateLimiter shared across workers when path is set, otherwise a LocalRateLimiter."""
+    if path:
+        return SQLiteRateLimiter(path)
+    return LocalRateLimiter()
@@ -0,0 +1,153 @@
+"""
+Full-text search over games and comments (SQLite FTS5).
+
+One FTS5 table indexes both: games under rowid 2 * id (title + description)
+and comments under rowid 2 * id + 1 (content), so every update or delete is a
+rowid lookup. Visibility (soft-deleted or hidden comments) is not indexed; it
+is checked against the comment table at query time, so moderation never has
+to touch the index.
+"""
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from models import db
+
+SEARCH_TABLE = 'search_index'
+
+# bm25 column weights: a title hit ranks well above a body hit
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+# Private-use markers around matched terms in excerpts (replaced with <mark> after escaping)
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+
+
+def search_available():
+    """FTS5 is SQLite-only; other databases run without search."""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def game_rowid(game_id):
+    return game_id * 2
+
+
+def comment_rowid(comment_id):
+    return comment_id * 2 + 1
+
+
+def create_search_index():
+    """Create the FTS5 table if it does not exist yet."""
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+        f"USING fts5(title, body, tokenize='porter unicode61 remove_diacritics 2')"
+    ))
+
+
+def _replace_entry(rowid, title, body):
+    db.session.execute(text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid'), {'rowid': rowid})
+    db.session.execute(text(f'INSERT INTO {SEARCH_TABLE} (rowid, title, body) VALUES (:rowid, :title, :body)'),
+                       {'rowid': rowid, 'title': title, 'body': body})
+
+
+def index_game(game):
+    """Add or refresh a game's entry (call in the same transaction as the change)."""
+    if search_available():
+        _replace_entry(game_rowid(game.id), game.title, game.description or '')
+
+
+def index_comment(comment):
+    """Add or refresh a comment's entry (the comment must be flushed so it has an id)."""
+    if search_available():
+        _replace_entry(comment_rowid(comment.id), '', comment.content)
+
+
+def unindex_game(game_id):
+    """Remove a game and all of its comments from the index (call before deleting the rows)."""
+    if search_available():
+        db.session.execute(text(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :rowid '
+            f'OR rowid IN (SELECT id * 2 + 1 FROM comment WHERE game_id = :game_id)'
+        ), {'rowid': game_rowid(game_id), 'game_id': game_id})
+
+
+def rebuild_search_index():
+    """Repopulate the whole index from the game and comment tables; returns (games, comments) indexed."""
+    create_search_index()
+    db.session.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+    games = db.session.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, body) "
+        f"SELECT id * 2, title, COALESCE(description, '') FROM game"
+    )).rowcount
+    comments = db.session.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, title, body) "
+        f"SELECT id * 2 + 1, '', content FROM comment"
+    )).rowcount
+    # Merge the b-tree segments written by the bulk insert
+    db.session.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+    return games, comments
+
+
+def match_expression(terms, max_terms=10):
+    """
+    Turn user input into an FTS5 query: every whitespace-separated word becomes a
+    quoted phrase (so operators and quotes in the input are plain text), all required.
+    """
+    words = terms.split()[:max_terms]
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+
+
+def encode_search_cursor(row):
+    """Encode a result's (score, rowid) position as a keyset cursor."""
+    return f'{row.score!r}_{row.rowid}'
+
+
+def decode_search_cursor(cursor):
+    """Decode a search cursor into (score, rowid), or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        score, rowid = cursor.rsplit('_', 1)
+        return float(score), int(rowid)
+    except ValueError:
+        return None
+
+
+def search_rows(terms, limit, after=None):
+    """
+    Ranked matches as rows of (rowid, score, excerpt), best first, skipping
+    soft-deleted and hidden comments (but not replies under them; callers filter
+    those). after is a (score, rowid) keyset position.
+    """
+    expression = match_expression(terms)
+    if not expression or not search_available():
+        return []
+    params = {'expression': expression, 'limit': limit,
+              'title_weight': TITLE_WEIGHT, 'body_weight': BODY_WEIGHT,
+              'mark_start': MATCH_START, 'mark_end': MATCH_END}
+    keyset = ''
+    if after:
+        keyset = 'WHERE score > :after_score OR (score = :after_score AND rowid > :after_rowid)'
+        params.update(after_score=after[0], after_rowid=after[1])
+    # Comment visibility is joined in by primary key; rows of deleted comments/games drop out too
+    return db.session.execute(text(f"""
+        SELECT rowid, score, excerpt FROM (
+            SELECT {SEARCH_TABLE}.rowid AS rowid,
+                   bm25({SEARCH_TABLE}, :title_weight, :body_weight) AS score,
+                   snippet({SEARCH_TABLE}, 1, :mark_start, :mark_end, '...', 16) AS excerpt
+            FROM {SEARCH_TABLE}
+            LEFT JOIN game ON {SEARCH_TABLE}.rowid % 2 = 0 AND game.id = {SEARCH_TABLE}.rowid / 2
+            LEFT JOIN comment ON {SEARCH_TABLE}.rowid % 2 = 1 AND comment.id = {SEARCH_TABLE}.rowid / 2
+            WHERE {SEARCH_TABLE} MATCH :expression
+              AND (game.id IS NOT NULL
+                   OR (comment.is_deleted = 0 AND (comment.tag IS NULL OR comment.tag != 'hidden')))
+        ) {keyset}
+        ORDER BY score, rowid
+        LIMIT :limit
+    """), params).all()
+
+
+def highlight_excerpt(excerpt):
+    """HTML-escape an excerpt and wrap the matched terms in <mark>."""
+    escaped = str(escape(excerpt or ''))
+    return Markup(escaped.replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import tempfile
+import unicodedata
+from urllib.parse import quote
+
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import NotFound
+from werkzeug.http import unquote_etag
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+
+def content_path(sha256, extension='zip'):
+    """Sharded relative path for a content hash, e.g. "ab/cd/abcd....zip"."""
+    return os.path.join(sha256[:2], sha256[2:4], f'{sha256}.{extension}')
+
+
+def receive_upload(stream, upload_folder, chunk_size=1024 * 1024):
+    """
+    Stream an upload to a temporary file under upload_folder in chunks while
+    computing its SHA-256. Returns (sha256, tmp_path, size); the caller moves it
+    into place with place_upload once it holds a reference to the content.
+    """
+    tmp_folder = os.path.join(upload_folder, 'tmp')
+    os.makedirs(tmp_folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    # Temp file lives on the same filesystem so the final move is an atomic rename
+    with tempfile.NamedTemporaryFile(dir=tmp_folder, delete=False) as tmp:
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return digest.hexdigest(), tmp.name, size
+
+
+def place_upload(tmp_path, upload_folder, sha256):
+    """
+    Move a received upload to its content-addressed path under upload_folder and
+    return that relative path. Identical content already there is replaced, which
+    restores the file if a delete unlinked it before the caller's reference committed.
+    """
+    relative_path = content_path(sha256)
+    final_path = os.path.join(upload_folder, relative_path)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp_path, final_path)
+    return relative_path
+
+
+def remove_stored_file(upload_folder, relative_path):
+    """Unlink a stored file and prune its now-empty shard directories."""
+    upload_folder = os.path.abspath(upload_folder)
+    path = os.path.join(upload_folder, relative_path)
+    if os.path.exists(path):
+        os.remove(path)
+    directory = os.path.dirname(path)
+    while directory != upload_folder and directory.startswith(upload_folder):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def attachment_header(download_name):
+    """Content-Disposition value for a download, with an RFC 5987 fallback for non-ASCII names."""
+    headers = Headers()
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        headers.set('Content-Disposition', 'attachment', filename=simple, **{'filename*': f"UTF-8''{quoted}"})
+    else:
+        headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return headers['Content-Disposition']
+
+
+class XAccelRedirectMiddleware:
+    """
+    Local stand-in for nginx's X-Accel-Redirect handling, for running without a
+    front proxy. Responses carrying an X-Accel-Redirect under prefix are replaced
+    by the referenced file from directory, with Range and conditional support.
+    """
+
+    # Upstream headers nginx keeps when it serves an X-Accel-Redirect target
+    passthrough_headers = ('Content-Disposition', 'Cache-Control', 'Expires', 'Set-Cookie')
+
+    def __init__(self, wsgi_app, prefix, directory):
+        self.wsgi_app = wsgi_app
+        self.prefix = prefix
+        self.directory = directory
+
+    def __call__(self, environ, start_response):
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured.update(status=status, headers=headers, exc_info=exc_info)
+            return lambda data: None
+
+        app_iter = self.wsgi_app(environ, capture_start_response)
+        headers = Headers(captured['headers'])
+        redirect_to = headers.get('X-Accel-Redirect')
+        if not redirect_to or not redirect_to.startswith(self.prefix):
+            start_response(captured['status'], captured['headers'], captured['exc_info'])
+            return app_iter
+
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+        path = safe_join(self.directory, redirect_to[len(self.prefix):])
+        if path is None or not os.path.isfile(path):
+            return NotFound()(environ, start_response)
+
+        etag = unquote_etag(headers['ETag'])[0] if 'ETag' in headers else True
+        response = send_file(path, environ, mimetype=headers.get('Content-Type'), etag=etag)
+        for name in self.passthrough_headers:
+            if name in headers:
+                response.headers.setlist(name, headers.getlist(name))
+        return response(environ, start_response)
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time: point it at a throwaway database first
+DATA_DIR = tempfile.mkdtemp(prefix='pyforge-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATA_DIR, 'test.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(DATA_DIR, 'uploads')
+os.environ['DISABLE_BOOTSTRAP_ADMIN'] = '1'
+os.environ['HIDDEN_COMMENT_SWEEP_INTERVAL'] = '0'
+os.environ['BCRYPT_ROUNDS'] = '4'
+os.environ['PROXY_FIX_HOPS'] = '1'  # One proxy in front, as on Render
+os.environ.pop('SHARED_CACHE_PATH', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='module')
+def app():
+    """The set-up app on empty tables (each test module seeds its own rows)."""
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    return app
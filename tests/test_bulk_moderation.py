@@ -0,0 +1,57 @@
+from app import db, get_unresolved_report_count, reported_comments_query
+from models import User, Game, Comment
+
+SPAMMER_IP = '10.0.0.9'
+
+
+def report(client, comment_id, reporter_ip):
+    response = client.post(f'/comment/{comment_id}/report', data={'reason': 'spam'},
+                           environ_base={'REMOTE_ADDR': reporter_ip})
+    assert response.status_code == 302
+
+
+def unresolved_ids():
+    return {comment.id for comment in reported_comments_query('unresolved', 'latest', 'desc')}
+
+
+def test_report_after_filter_based_bulk_resolve_is_unresolved(app):
+    with app.app_context():
+        admin = User(username='moderator', email='moderator@example.com', is_admin=True)
+        admin.set_password('moderator')
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add(Game(title='Bulk game', filename='bulk.zip', uploader_id=admin.id))
+        db.session.commit()
+        game_id = Game.query.filter_by(title='Bulk game').one().id
+
+    guest = app.test_client()
+    for i in range(3):
+        guest.post(f'/game/{game_id}/comment', data={'content': f'spam {i}'},
+                   environ_base={'REMOTE_ADDR': SPAMMER_IP})
+    with app.app_context():
+        reported, unreported, later = [comment.id for comment in
+                                       Comment.query.filter_by(author_ip=SPAMMER_IP).order_by(Comment.id)]
+    report(guest, reported, '192.0.2.1')
+
+    admin_client = app.test_client()
+    admin_client.post('/login', data={'username': 'moderator', 'password': 'moderator'})
+    response = admin_client.post('/admin/comments/bulk', data={'action': 'resolve', 'author_ip': SPAMMER_IP},
+                                 follow_redirects=True)
+    assert '1 comments marked as resolved.' in response.get_data(as_text=True)
+
+    with app.app_context():
+        assert not db.session.get(Comment, unreported).is_report_resolved
+        assert not db.session.get(Comment, later).is_report_resolved
+        assert unresolved_ids() == set()
+
+    # A report on a comment the filter matched but that was never reported reaches the queue
+    report(guest, later, '192.0.2.2')
+    with app.app_context():
+        assert unresolved_ids() == {later}
+        assert get_unresolved_report_count() == 1
+
+    response = admin_client.post('/admin/comments/bulk', data={'action': 'unresolve', 'author_ip': SPAMMER_IP},
+                                 follow_redirects=True)
+    assert '1 comments marked as unresolved.' in response.get_data(as_text=True)
+    with app.app_context():
+        assert unresolved_ids() == {reported, later}
@@ -0,0 +1,30 @@
+from app import db
+from models import User, Game
+
+FAR_FUTURE = 'Fri, 01 Jan 2100 00:00:00 GMT'
+
+
+def test_index_revalidates_by_etag_only(app):
+    with app.app_context():
+        user = User(username='uploader', email='uploader@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all([Game(title=f'Game {i}', filename=f'game-{i}.zip', uploader_id=user.id) for i in range(2)])
+        db.session.commit()
+
+    client = app.test_client()
+    first = client.get('/')
+    assert first.status_code == 200
+    assert first.headers.get('Last-Modified') is None
+    etag = first.headers['ETag']
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+
+    # A date alone cannot prove the list unchanged (deletions and renames do not move it)
+    assert client.get('/', headers={'If-Modified-Since': FAR_FUTURE}).status_code == 200
+
+    with app.app_context():
+        db.session.delete(Game.query.filter_by(title='Game 0').one())
+        db.session.commit()
+    response = client.get('/', headers={'If-None-Match': etag, 'If-Modified-Since': FAR_FUTURE})
+    assert response.status_code == 200
+    assert 'Game 0' not in response.get_data(as_text=True)
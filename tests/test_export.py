@@ -0,0 +1,24 @@
+import csv
+import io
+import json
+
+from export import iter_csv, iter_ndjson
+
+COLUMNS = ['id', 'content', 'report_count']
+ROWS = [(1, '=HYPERLINK("http://example.com","click")', 0), (2, '+1+1', -3), (3, '-2', 1),
+        (4, '@SUM(A1)', 2), (5, '\tcmd', 0), (6, '\rcmd', 0), (7, 'plain = text', 0), (8, None, 0)]
+
+
+def test_csv_neutralizes_formula_cells():
+    rows = list(csv.reader(io.StringIO(''.join(iter_csv(COLUMNS, [ROWS])), newline='')))
+    assert rows[0] == COLUMNS
+    assert [row[1] for row in rows[1:]] == ["'=HYPERLINK(\"http://example.com\",\"click\")", "'+1+1", "'-2",
+                                             "'@SUM(A1)", "'\tcmd", "'\rcmd", 'plain = text', '']
+    # Numbers are not text: a negative count stays a number
+    assert rows[2][2] == '-3'
+
+
+def test_ndjson_keeps_text_unchanged():
+    lines = ''.join(iter_ndjson(COLUMNS, [ROWS])).splitlines()
+    assert json.loads(lines[0])['content'] == ROWS[0][1]
+    assert json.loads(lines[1])['content'] == '+1+1'
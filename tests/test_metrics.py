@@ -0,0 +1,29 @@
+import time
+
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from metrics import RequestMetrics
+
+
+def test_failed_statement_leaves_no_timing_state():
+    app = Flask(__name__)
+    engine = create_engine('sqlite://')
+    metrics = RequestMetrics()
+    metrics.instrument(app, engine)
+
+    with app.test_request_context(), engine.connect() as conn:
+        app.preprocess_request()
+        info_before = dict(conn.info)
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM missing_table'))
+        # Nothing may pile up on the pooled connection
+        assert dict(conn.info) == info_before
+        # Long enough that a start time left over from the failed statement would show
+        time.sleep(0.2)
+        conn.execute(text('SELECT 1'))
+        stats = g.request_stats
+        assert stats.queries == 1
+        assert stats.sql_time < 0.1
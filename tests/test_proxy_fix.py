@@ -0,0 +1,31 @@
+from app import db
+from models import User, Game, Comment
+
+
+def test_guests_behind_proxy_get_their_own_rate_limit(app):
+    with app.app_context():
+        user = User(username='proxied', email='proxied@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Game(title='Proxy game', filename='proxy.zip', uploader_id=user.id))
+        db.session.commit()
+        game_id = Game.query.filter_by(title='Proxy game').one().id
+    limit = app.config['COMMENT_RATE_LIMIT']
+    client = app.test_client()
+    proxy = {'REMOTE_ADDR': '10.1.1.1'}
+
+    def post(content, client_ip):
+        client.post(f'/game/{game_id}/comment', data={'content': content},
+                    headers={'X-Forwarded-For': client_ip}, environ_base=proxy)
+
+    # One guest going over the limit does not throttle the others behind the same proxy
+    for i in range(limit + 2):
+        post(f'flood {i}', '198.51.100.7')
+    for i in range(limit):
+        post(f'guest {i}', f'203.0.113.{i + 1}')
+
+    with app.app_context():
+        authors = [ip for ip, in db.session.query(Comment.author_ip).filter(Comment.game_id == game_id)]
+    assert authors.count('198.51.100.7') == limit
+    assert sorted(ip for ip in authors if ip.startswith('203.')) == [f'203.0.113.{i + 1}' for i in range(limit)]
+    assert '10.1.1.1' not in authors
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db, hot_queries, explain_query_plan, full_table_scans
+from models import User, Game, Comment, Report
+
+
+@pytest.fixture(scope='module')
+def app(app):
+    """The app on a seeded SQLite database: games, threaded comments, hidden ones and reports."""
+    start = datetime.utcnow() - timedelta(days=30)
+    with app.app_context():
+        user = User(username='planner', email='planner@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.execute(Game.__table__.insert(), [
+            {'id': game_id, 'title': f'Game {game_id}', 'description': 'Query plan game',
+             'filename': f'plan-{game_id}.zip', 'uploader_id': user.id,
+             'created_at': start + timedelta(minutes=game_id), 'updated_at': start + timedelta(minutes=game_id)}
+            for game_id in range(1, 51)
+        ])
+        comments = []
+        for comment_id in range(1, 501):
+            game_id = comment_id % 50 + 1 if comment_id % 10 else None
+            parent_id = comment_id - 1 if comment_id % 5 == 0 else None
+            created_at = start + timedelta(seconds=comment_id)
+            comments.append({
+                'id': comment_id, 'content': f'Comment {comment_id}',
+                'tag': 'hidden' if comment_id % 7 == 0 else None,
+                'hidden_at': created_at if comment_id % 7 == 0 else None,
+                'target_type': 'game' if game_id else 'request', 'target_id': game_id, 'game_id': game_id,
+                'user_id': user.id, 'parent_id': parent_id,
+                'thread_path': (f'{parent_id:010d}/' if parent_id else '') + f'{comment_id:010d}/',
+                'depth': 1 if parent_id else 0, 'is_deleted': False,
+                'is_report_resolved': comment_id % 3 == 0, 'report_count': 1 if comment_id % 4 == 0 else 0,
+                'created_at': created_at, 'updated_at': created_at,
+            })
+        db.session.execute(Comment.__table__.insert(), comments)
+        db.session.execute(Report.__table__.insert(), [
+            {'comment_id': comment_id, 'reporter_ip': '127.0.0.1', 'reason': 'spam', 'created_at': start}
+            for comment_id in range(4, 501, 4)
+        ])
+        db.session.commit()
+    return app
+
+
+def test_hot_queries_avoid_full_table_scans(app):
+    with app.app_context():
+        for name, query in hot_queries():
+            plan = explain_query_plan(query)
+            assert plan, name
+            assert full_table_scans(plan) == [], (name, plan)
+
+
+def test_unindexed_filter_is_reported_as_full_scan(app):
+    with app.app_context():
+        plan = explain_query_plan(Comment.query.filter(Comment.content == 'Comment 1'))
+    assert full_table_scans(plan) == ['SCAN comment']
+
+
+def test_check_query_plans_command(app):
+    result = app.test_cli_runner().invoke(args=['check-query-plans'])
+    assert result.exit_code == 0, result.output
+    assert '[QueryPlan] OK: no full table scans' in result.output
@@ -0,0 +1,99 @@
+import io
+import os
+import threading
+import time
+import zipfile
+
+import pytest
+
+import app as app_module
+from app import db
+from models import User, Game, StoredFile
+
+
+@pytest.fixture(scope='module')
+def app(app):
+    with app.app_context():
+        user = User(username='uploader', email='uploader@example.com')
+        user.set_password('uploader')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def logged_in(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'uploader', 'password': 'uploader'})
+    return client
+
+
+def game_zip(marker):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('main.py', f'print({marker!r})')
+    return buffer.getvalue()
+
+
+def upload(client, title, data):
+    response = client.post('/game/upload', data={'title': title, 'game_file': (io.BytesIO(data), 'game.zip')})
+    assert response.status_code == 302, response.get_data(as_text=True)
+    with app_module.app.app_context():
+        game = Game.query.filter_by(title=title).one()
+        return game.id, os.path.join(app_module.app.config['UPLOAD_FOLDER'], game.filename), game.file_sha256
+
+
+def ref_count(sha256):
+    with app_module.app.app_context():
+        stored_file = db.session.get(StoredFile, sha256)
+        return stored_file.ref_count if stored_file else None
+
+
+def test_delete_between_reference_and_placement_keeps_file(app, monkeypatch):
+    client = logged_in(app)
+    data = game_zip('between')
+    old_id, path, sha256 = upload(client, 'Old copy', data)
+    real_place_upload = app_module.place_upload
+
+    def place_after_delete(*args):
+        # The upload's reference is committed; the old game's delete runs now
+        assert logged_in(app).post(f'/game/{old_id}/delete').status_code == 302
+        assert os.path.exists(path)
+        return real_place_upload(*args)
+
+    monkeypatch.setattr(app_module, 'place_upload', place_after_delete)
+    upload(client, 'New copy', data)
+    assert os.path.exists(path)
+    assert ref_count(sha256) == 1
+
+
+def test_upload_waits_for_purge_and_restores_file(app, monkeypatch):
+    client = logged_in(app)
+    data = game_zip('purge')
+    game_id, path, sha256 = upload(client, 'Purged', data)
+    real_remove = app_module.remove_stored_file
+    uploader = {}
+
+    def remove_while_uploading(*args):
+        # The row delete is uncommitted: a concurrent upload must wait for the unlink to finish
+        thread = threading.Thread(target=lambda: uploader.update(result=upload(logged_in(app), 'Re-upload', data)))
+        thread.start()
+        time.sleep(0.5)
+        uploader['waited'] = thread.is_alive()
+        uploader['thread'] = thread
+        return real_remove(*args)
+
+    monkeypatch.setattr(app_module, 'remove_stored_file', remove_while_uploading)
+    assert client.post(f'/game/{game_id}/delete').status_code == 302
+    uploader['thread'].join(10)
+    assert uploader['waited']
+    assert uploader['result'][1] == path
+    assert os.path.exists(path)
+    assert ref_count(sha256) == 1
+
+
+def test_last_delete_unlinks_file(app):
+    client = logged_in(app)
+    game_id, path, sha256 = upload(client, 'Only copy', game_zip('only'))
+    assert client.post(f'/game/{game_id}/delete').status_code == 302
+    assert not os.path.exists(path)
+    assert ref_count(sha256) is None
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app import db, sweep_hidden_comments
+from models import User, Game, Comment, CommentTagHistory
+
+
+def hidden_comments(count):
+    """Comments hidden eight days ago on a new game; returns their ids."""
+    hidden_at = datetime.utcnow() - timedelta(days=8)
+    user = User(username='sweep', email='sweep@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    game = Game(title='Sweep game', filename='sweep.zip', uploader_id=user.id)
+    db.session.add(game)
+    db.session.flush()
+    comments = [Comment(content=f'hidden {i}', target_type='game', target_id=game.id, game_id=game.id,
+                        tag='hidden', original_tag='bug', hidden_at=hidden_at) for i in range(count)]
+    db.session.add_all(comments)
+    db.session.commit()
+    return [comment.id for comment in comments]
+
+
+def test_fallback_sweep_skips_rows_another_sweeper_restored(app, monkeypatch):
+    with app.app_context():
+        ids = hidden_comments(3)
+        monkeypatch.setattr(db.engine.dialect, 'update_returning', False)
+        raced = []
+
+        def other_sweeper(conn, cursor, statement, parameters, context, executemany):
+            # Between our SELECT and our UPDATEs, another worker restores the first comment
+            if statement.startswith('UPDATE comment') and not raced:
+                raced.append(ids[0])
+                cursor.connection.execute("UPDATE comment SET tag = original_tag, hidden_at = NULL WHERE id = ?",
+                                          (ids[0],))
+
+        event.listen(db.engine, 'before_cursor_execute', other_sweeper)
+        try:
+            restored = sweep_hidden_comments()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', other_sweeper)
+
+        assert raced and restored == 2
+        history = [row.comment_id for row in CommentTagHistory.query.filter(CommentTagHistory.comment_id.in_(ids))]
+        assert sorted(history) == ids[1:]
+        assert all(db.session.get(Comment, comment_id).tag == 'bug' for comment_id in ids)
+        assert sweep_hidden_comments() == 0
@@ -0,0 +1,61 @@
+import os
+import socket
+import subprocess
+import time
+import urllib.parse
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytest.importorskip('gunicorn')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url, data=None):
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    with urllib.request.urlopen(url, data=body, timeout=10) as response:
+        return response.status, response.read().decode()
+
+
+@pytest.mark.parametrize('worker_class', ['gthread', 'gevent'])
+def test_gunicorn_serves_pages_with_worker_class(worker_class, tmp_path):
+    if worker_class == 'gevent':
+        pytest.importorskip('gevent')
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'test.db'),
+               UPLOAD_FOLDER=str(tmp_path / 'uploads'), SHARED_CACHE_PATH=str(tmp_path / 'shared-cache.db'),
+               GUNICORN_WORKER_CLASS=worker_class, WEB_CONCURRENCY='2', PORT=str(port),
+               DISABLE_BOOTSTRAP_ADMIN='1', HIDDEN_COMMENT_SWEEP_INTERVAL='0', PROXY_FIX_HOPS='0')
+    with open(tmp_path / 'gunicorn.log', 'w') as log:
+        server = subprocess.Popen(['gunicorn', 'app:create_app()'], cwd=ROOT, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        try:
+            base = f'http://127.0.0.1:{port}'
+            deadline = time.time() + 30
+            while True:
+                try:
+                    assert fetch(base + '/')[0] == 200
+                    break
+                except OSError:
+                    assert server.poll() is None and time.time() < deadline, (tmp_path / 'gunicorn.log').read_text()
+                    time.sleep(0.2)
+
+            # Warm both workers' thread caches, post, then every worker must show the new comment
+            for _ in range(10):
+                fetch(base + '/requests')
+            assert fetch(base + '/requests/comment', {'content': f'posted under {worker_class}'})[0] == 200
+            for _ in range(10):
+                status, html = fetch(base + '/requests')
+                assert status == 200
+                assert f'posted under {worker_class}' in html
+        finally:
+            server.terminate()
+            server.wait(30)
+    assert 'Traceback' not in (tmp_path / 'gunicorn.log').read_text()